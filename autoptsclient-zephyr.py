@@ -29,6 +29,12 @@ class ZephyrClient(autoptsclient.Client):
         arg_parser = autoptsclient.CliParser("PTS automation client",
                                              autoprojects.iutctl.Board.names)
 
+        arg_parser.add_argument("--warm-reset", action='store_true',
+                                default=False,
+                                help="Keep BTP socket and socat running "
+                                     "between test cases and only reset the "
+                                     "board. Requires --board.")
+
         args = arg_parser.parse_args()
 
         if args.hci is None:
@@ -21,6 +21,7 @@ import _locale
 
 import schedule
 
+import bot.common
 from bot.config import BotProjects
 from bot.zephyr import main as zephyr
 from bot.mynewt import main as mynewt
@@ -64,6 +65,9 @@ def main():
         else:
             project2main[project['name']](project)
 
+    # Results are published in the background, see bot.common.Publisher
+    bot.common.publisher.wait()
+
 
 if __name__ == "__main__":
     if have_admin_rights():  # root privileges are not needed
@@ -20,6 +20,7 @@ import argparse
 import datetime
 import errno
 import importlib
+import json
 import logging
 import os
 import queue
@@ -34,7 +35,6 @@ import traceback
 import xml.etree.ElementTree as ElementTree
 import xmlrpc.client
 from distutils.spawn import find_executable
-from xmlrpc.server import SimpleXMLRPCServer
 
 import _locale
 from termcolor import colored
@@ -42,11 +42,13 @@ from termcolor import colored
 import ptsprojects.ptstypes as ptstypes
 from config import SERVER_PORT, CLIENT_PORT
 from ptsprojects import stack
-from ptsprojects.testcase import PTSCallback, TestCaseLT1, TestCaseLT2
+from ptsprojects.testcase import PTSCallback, TestCase, TestCaseLT1, \
+    TestCaseLT2
 from ptsprojects.testcase_db import TestCaseTable
 from pybtp import btp
 from pybtp.types import BTPError, SynchError
-from utils import InterruptableThread
+from utils import InterruptableThread, PersistentTransport, \
+    ThreadedXMLRPCServer
 from winutils import have_admin_rights
 
 log = logging.debug
@@ -70,6 +72,7 @@ class ClientCallback(PTSCallback):
         super().__init__()
         self.exception = queue.Queue()
         self._pending_responses = {}
+        self._pending_responses_cond = threading.Condition()
 
     def error_code(self):
         """Return error code or None if there are no errors
@@ -178,13 +181,20 @@ class ClientCallback(PTSCallback):
 
         return testcase_response
 
-    def get_pending_response(self, test_case_name):
-        log("%s.%s, %s", self.__class__.__name__,
-            self.get_pending_response.__name__, test_case_name)
-        if not self._pending_responses:
-            return None
+    def get_pending_response(self, test_case_name, timeout=0):
+        """Return pending response of the test case or None
+
+        timeout - time in seconds to wait for the response to be set, so
+                  that the server can long-poll for it
+        """
+        log("%s.%s, %s %r", self.__class__.__name__,
+            self.get_pending_response.__name__, test_case_name, timeout)
+
+        with self._pending_responses_cond:
+            self._pending_responses_cond.wait_for(
+                lambda: test_case_name in self._pending_responses, timeout)
+            rsp = self._pending_responses.pop(test_case_name, None)
 
-        rsp = self._pending_responses.pop(test_case_name, None)
         if not rsp:
             return rsp
 
@@ -197,10 +207,14 @@ class ClientCallback(PTSCallback):
         response = pending_response[1]
         delay = pending_response[2]
 
-        self._pending_responses[tc_name] = {"value": response, "delay": delay}
+        with self._pending_responses_cond:
+            self._pending_responses[tc_name] = {"value": response,
+                                                "delay": delay}
+            self._pending_responses_cond.notify_all()
 
     def clear_pending_responses(self):
-        self._pending_responses = {}
+        with self._pending_responses_cond:
+            self._pending_responses = {}
 
     def cleanup(self):
         self.clear_pending_responses()
@@ -213,7 +227,9 @@ class ClientCallback(PTSCallback):
 class CallbackThread(threading.Thread):
     """Thread for XML-RPC callback server
 
-    To prevent SimpleXMLRPCServer blocking whole app it is started in a thread
+    To prevent XML-RPC server blocking whole app it is started in a thread.
+    The server handles each connection in a separate thread, so that a slow
+    on_implicit_send does not block log callbacks.
 
     """
 
@@ -231,8 +247,8 @@ class CallbackThread(threading.Thread):
 
         log("Serving on port %s ...", self.port)
 
-        self.server = SimpleXMLRPCServer(("", self.port),
-                                         allow_none=True, logRequests=False)
+        self.server = ThreadedXMLRPCServer(("", self.port),
+                                           allow_none=True, logRequests=False)
         self.server.register_instance(self.callback)
         self.server.register_introspection_functions()
         self.server.serve_forever()
@@ -314,6 +330,89 @@ def init_logging(tag=""):
                         level=logging.DEBUG)
 
 
+WORKSPACE_CACHE_DIR = "workspace_cache"
+
+
+class WorkspaceCache:
+    """PTS proxy wrapper serving workspace metadata from local cache
+
+    Test case catalogue of the workspace is stored on disk, keyed by hash of
+    the workspace file and PTS version, and is fetched from PTS only if
+    there is no matching cache file. Other calls are passed to the wrapped
+    proxy.
+
+    """
+
+    def __init__(self, pts, cache_dir=WORKSPACE_CACHE_DIR):
+        self._pts = pts
+        self._cache_dir = cache_dir
+        self._catalogue = None
+
+    def __getattr__(self, name):
+        return getattr(self._pts, name)
+
+    def _cache_path(self):
+        key = "%s_%s" % (self._pts.get_workspace_hash(),
+                         self._pts.get_version())
+        return os.path.join(self._cache_dir, key + ".json")
+
+    def _load(self, path):
+        if not os.path.exists(path):
+            return None
+
+        try:
+            with open(path, 'r') as f:
+                return json.load(f)
+        except (OSError, ValueError) as e:
+            logging.exception(e)
+            return None
+
+    def _store(self, path, catalogue):
+        os.makedirs(self._cache_dir, exist_ok=True)
+        tmp_path = path + ".tmp"
+
+        with open(tmp_path, 'w') as f:
+            json.dump(catalogue, f)
+
+        os.replace(tmp_path, path)
+
+    def get_catalogue(self):
+        if self._catalogue is not None:
+            return self._catalogue
+
+        path = self._cache_path()
+        catalogue = self._load(path)
+        if catalogue is None:
+            log("Workspace cache miss: %s", path)
+            catalogue = self._pts.get_catalogue()
+            self._store(path, catalogue)
+
+        self._catalogue = catalogue
+
+        return self._catalogue
+
+    def invalidate(self):
+        """Drop catalogue, cache file is revalidated on next use"""
+        self._catalogue = None
+
+    def get_project_list(self):
+        return tuple(self.get_catalogue().keys())
+
+    def get_test_case_list(self, project_name):
+        return tuple(self.get_catalogue()[project_name].keys())
+
+    def get_test_case_description(self, project_name, test_case_name):
+        test_case = self.get_catalogue().get(project_name, {}).get(
+            test_case_name)
+
+        # Catalogue lists active test cases only
+        if test_case is None:
+            return self._pts.get_test_case_description(project_name,
+                                                       test_case_name)
+
+        return test_case["description"]
+
+
 class FakeProxy:
     """Fake PTS XML-RPC proxy client.
 
@@ -323,6 +422,9 @@ class FakeProxy:
         def listMethods(self):
             pass
 
+        def multicall(self, calls):
+            return [[None] for _ in calls]
+
     def __init__(self):
         self.system = FakeProxy.System()
 
@@ -353,6 +455,9 @@ class FakeProxy:
     def update_pixit_param(self, project_name, param_name, new_param_value):
         pass
 
+    def set_pixits(self, project_name, pixits):
+        pass
+
     def run_test_case(self, project_name, test_case_name):
         pass
 
@@ -403,9 +508,14 @@ def init_pts_thread_entry(proxy, local_address, local_port, workspace_path,
 
     if bd_addr:
         projects = proxy.get_project_list()
+        multicall = xmlrpc.client.MultiCall(proxy)
         for project_name in projects:
             log("Set bd_addr PIXIT: %s for project: %s", bd_addr, project_name)
-            proxy.update_pixit_param(project_name, "TSPX_bd_addr_iut", bd_addr)
+            multicall.update_pixit_param(project_name, "TSPX_bd_addr_iut", bd_addr)
+
+        # Faults are raised only when results are iterated
+        for _ in multicall():
+            pass
 
     proxy.enable_maximum_logging(enable_max_logs)
 
@@ -424,9 +534,9 @@ def init_pts(args, tc_db_table_name=None):
         if AUTO_PTS_LOCAL:
             proxy = FakeProxy()
         else:
-            proxy = xmlrpc.client.ServerProxy(
+            proxy = WorkspaceCache(xmlrpc.client.ServerProxy(
                 "http://{}:{}/".format(server_addr, server_port),
-                allow_none=True, )
+                transport=PersistentTransport(), allow_none=True, ))
 
         print("(%r) Starting PTS %s:%s ..." % (id(proxy), server_addr, server_port))
 
@@ -440,7 +550,9 @@ def init_pts(args, tc_db_table_name=None):
 
     if tc_db_table_name:
         global TEST_CASE_DB
-        TEST_CASE_DB = TestCaseTable(tc_db_table_name)
+        TEST_CASE_DB = TestCaseTable(tc_db_table_name,
+                                     board=getattr(args, 'board', None),
+                                     commit=getattr(args, 'commit', None))
 
     for index, thread in enumerate(thread_list):
         thread.join(timeout=180.0)
@@ -479,7 +591,8 @@ def get_result_color(status):
 
 
 class TestCaseRunStats:
-    def __init__(self, projects, test_cases, retry_count, db=None):
+    def __init__(self, projects, test_cases, retry_count, db=None,
+                 journal=None):
 
         self.run_count_max = retry_count + 1  # Run test at least once
         self.run_count = 0  # Run count of current test case
@@ -490,10 +603,18 @@ class TestCaseRunStats:
         self.margin = 3
         self.index = 0
 
-        self.xml_results = tempfile.NamedTemporaryFile(delete=False).name
-        root = ElementTree.Element("results")
-        tree = ElementTree.ElementTree(root)
-        tree.write(self.xml_results)
+        # Results indexed by test case name, in order of first run
+        self.results = {}
+
+        # Append-only JSON lines journal of updates, used to recover
+        # results of a session that was interrupted
+        if journal is None:
+            journal = tempfile.NamedTemporaryFile(delete=False,
+                                                  suffix=".jsonl").name
+
+        self.journal = journal
+        self._load_journal()
+        self._journal_file = open(self.journal, 'a')
 
         self.db = db
 
@@ -507,69 +628,86 @@ class TestCaseRunStats:
         else:
             self.est_duration = 0
 
-    def update(self, test_case_name, duration, status):
-        tree = ElementTree.parse(self.xml_results)
-        root = tree.getroot()
+    def _load_journal(self):
+        if not os.path.exists(self.journal):
+            return
 
-        elem = root.find("./test_case[@name='%s']" % test_case_name)
-        if elem is None:
-            elem = ElementTree.SubElement(root, 'test_case')
+        with open(self.journal, 'r') as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    # Last line may be truncated if the client was killed
+                    log("Skipping malformed journal entry %r", line)
+                    continue
+
+                self.results[entry["name"]] = entry
 
+    def update(self, test_case_name, duration, status):
+        entry = self.results.get(test_case_name)
+        if entry is None:
             status_previous = None
             if self.db:
                 status_previous = self.db.get_result(test_case_name)
 
-            elem.attrib["project"] = test_case_name.split('/')[0]
-            elem.attrib["name"] = test_case_name
-            elem.attrib["duration"] = str(duration)
-            elem.attrib["status"] = ""
-            elem.attrib["status_previous"] = str(status_previous)
+            entry = {
+                "project": test_case_name.split('/')[0],
+                "name": test_case_name,
+                "duration": duration,
+                "status": "",
+                "status_previous": str(status_previous),
+                "run_count": 0,
+            }
+            self.results[test_case_name] = entry
 
-            run_count = 0
-        else:
-            run_count = int(elem.attrib["run_count"])
+        entry["status"] = status
 
-        elem.attrib["status"] = status
+        regression = bool(entry["status"] != "PASS" and entry["status_previous"] == "PASS")
 
-        regression = bool(elem.attrib["status"] != "PASS" and elem.attrib["status_previous"] == "PASS")
+        entry["regression"] = regression
+        entry["run_count"] += 1
 
-        elem.attrib["regression"] = str(regression)
-        elem.attrib["run_count"] = str(run_count + 1)
-
-        tree.write(self.xml_results)
+        self._journal_file.write(json.dumps(entry) + '\n')
+        self._journal_file.flush()
 
         return regression
 
-    def get_results(self):
-        tree = ElementTree.parse(self.xml_results)
-        root = tree.getroot()
+    def close(self):
+        if self._journal_file:
+            self._journal_file.close()
+            self._journal_file = None
 
-        results = {}
+    def export_xml(self, xml_path):
+        """Write results to XML file, one test_case element per test case"""
+        root = ElementTree.Element("results")
 
-        for tc_xml in root.findall("./test_case"):
-            results[tc_xml.attrib["name"]] = \
-                tc_xml.attrib["status"]
+        for entry in self.results.values():
+            elem = ElementTree.SubElement(root, 'test_case')
+            elem.attrib["project"] = entry["project"]
+            elem.attrib["name"] = entry["name"]
+            elem.attrib["duration"] = str(entry["duration"])
+            elem.attrib["status"] = entry["status"]
+            elem.attrib["status_previous"] = entry["status_previous"]
+            elem.attrib["regression"] = str(entry["regression"])
+            elem.attrib["run_count"] = str(entry["run_count"])
 
-        return results
+        ElementTree.ElementTree(root).write(xml_path)
 
-    def get_regressions(self):
-        tree = ElementTree.parse(self.xml_results)
-        root = tree.getroot()
-        tcs_xml = root.findall("./test_case[@regression='True']")
+    def get_results(self):
+        return {name: entry["status"] for name, entry in self.results.items()}
 
-        return [tc_xml.attrib["name"] for tc_xml in tcs_xml]
+    def get_regressions(self):
+        return [name for name, entry in self.results.items()
+                if entry["regression"]]
 
     def get_status_count(self):
-        tree = ElementTree.parse(self.xml_results)
-        root = tree.getroot()
-
         status_dict = {}
 
-        for test_case_xml in root.findall("./test_case"):
-            if test_case_xml.attrib["status"] not in status_dict:
-                status_dict[test_case_xml.attrib["status"]] = 0
+        for entry in self.results.values():
+            if entry["status"] not in status_dict:
+                status_dict[entry["status"]] = 0
 
-            status_dict[test_case_xml.attrib["status"]] += 1
+            status_dict[entry["status"]] += 1
 
         return status_dict
 
@@ -705,22 +843,48 @@ def get_error_code(exc):
     return error_code
 
 
-def synchronize_instances(state, break_state=None):
-    """Synchronize instances to be in one state before executing further"""
-    while True:
-        time.sleep(1)
-        match = True
+class InstancesSync:
+    """Synchronizes states of test case instances run by LT1 and LT2 threads
 
-        for tc in RUNNING_TEST_CASE.values():
-            if tc.state != state:
-                if break_state and tc.state in break_state:
-                    raise SynchError
+    Instances waiting for a state are woken up as soon as the last one of
+    them enters it.
 
-                match = False
-                continue
+    """
 
-        if match:
-            return
+    def __init__(self, test_cases):
+        self._cond = threading.Condition()
+        self._test_cases = test_cases
+
+        # Do not match stale states left by previous run
+        for tc in test_cases:
+            tc.state = None
+
+    def set_state(self, test_case, state):
+        with self._cond:
+            test_case.state = state
+            self._cond.notify_all()
+
+    def synchronize(self, state, break_state=None):
+        """Wait for all instances to be in one state before executing further
+
+        Raises SynchError if any instance enters one of break_state states.
+
+        """
+        with self._cond:
+            while True:
+                match = True
+
+                for tc in self._test_cases:
+                    if tc.state != state:
+                        if break_state and tc.state in break_state:
+                            raise SynchError
+
+                        match = False
+
+                if match:
+                    return
+
+                self._cond.wait()
 
 
 def run_test_case_thread_entry_wrapper(func):
@@ -736,7 +900,7 @@ def run_test_case_thread_entry_wrapper(func):
 
 
 @run_test_case_thread_entry_wrapper
-def run_test_case_thread_entry(pts, test_case, exceptions):
+def run_test_case_thread_entry(pts, test_case, exceptions, sync):
     """Runs the test case specified by a TestCase instance.
 
     [1] xmlrpclib.Fault normally happens due to unhandled exception in the
@@ -756,12 +920,12 @@ def run_test_case_thread_entry(pts, test_case, exceptions):
 
     try:
         RUNNING_TEST_CASE[test_case.name] = test_case
-        test_case.state = "PRE_RUN"
+        sync.set_state(test_case, "PRE_RUN")
         test_case.pre_run()
         test_case.status = "RUNNING"
-        test_case.state = "RUNNING"
+        sync.set_state(test_case, "RUNNING")
         pts.callback_thread.set_current_test_case(test_case.name)
-        synchronize_instances(test_case.state)
+        sync.synchronize(test_case.state)
         error_code = pts.run_test_case(test_case.project_name, test_case.name)
 
         log("After run_test_case error_code=%r status=%r",
@@ -789,8 +953,8 @@ def run_test_case_thread_entry(pts, test_case, exceptions):
         except Exception as error:
             logging.exception(error)
             exceptions.put(error)
-        test_case.state = "FINISHING"
-        synchronize_instances(test_case.state)
+        sync.set_state(test_case, "FINISHING")
+        sync.synchronize(test_case.state)
         test_case.post_run(error_code)  # stop qemu and other commands
         del RUNNING_TEST_CASE[test_case.name]
 
@@ -858,16 +1022,21 @@ def run_test_case(ptses, test_case_instances, test_case_name, stats,
         # Multi-instance related stuff
         pts_threads = []
 
+        if test_case_lt2:
+            sync = InstancesSync([test_case_lt1, test_case_lt2])
+        else:
+            sync = InstancesSync([test_case_lt1])
+
         pts_thread = threading.Thread(
             target=run_test_case_thread_entry,
-            args=(ptses[0], test_case_lt1, exceptions))
+            args=(ptses[0], test_case_lt1, exceptions, sync))
         pts_threads.append(pts_thread)
         pts_thread.start()
 
         if test_case_lt2:
             pts_thread = threading.Thread(
                 target=run_test_case_thread_entry,
-                args=(ptses[1], test_case_lt2, exceptions))
+                args=(ptses[1], test_case_lt2, exceptions, sync))
             pts_threads.append(pts_thread)
             pts_thread.start()
 
@@ -891,6 +1060,145 @@ test_case_blacklist = [
 ]
 
 
+def get_shard(test_cases, test_case_instances, index, count,
+              durations=None):
+    """Return test cases assigned to one of the shards of the test plan
+
+    Single lower tester test cases are distributed round-robin across
+    shards or, if durations are given, longest first to the least loaded
+    shard. Test cases requiring a second lower tester are all assigned
+    to the first shard, which has to be run with two PTS instances.
+
+    index - shard index, counted from 0
+    count - number of shards
+    durations - dict of expected test case durations
+    """
+    lt2_test_cases = {tc.name for tc in test_case_instances or []
+                      if isinstance(tc, TestCaseLT1) and tc.name_lt2}
+
+    single_lt = [tc for tc in test_cases if tc not in lt2_test_cases]
+
+    if durations is None:
+        shard = set(single_lt[index::count])
+    else:
+        loads = [0] * count
+        loads[0] = sum(durations[tc] for tc in test_cases
+                       if tc in lt2_test_cases)
+        shard = set()
+
+        # sorted() is stable, so equal durations keep the plan order
+        for tc in sorted(single_lt, key=lambda tc: -durations[tc]):
+            least_loaded = loads.index(min(loads))
+            loads[least_loaded] += durations[tc]
+            if least_loaded == index:
+                shard.add(tc)
+
+    if index == 0:
+        shard.update(lt2_test_cases)
+
+    return [tc for tc in test_cases if tc in shard]
+
+
+def parse_shard(value):
+    """Parse INDEX/COUNT shard argument into 0-based (index, count) tuple"""
+    try:
+        index, count = (int(x) for x in value.split('/'))
+    except ValueError:
+        raise argparse.ArgumentTypeError(
+            "%r is not in INDEX/COUNT format" % value)
+
+    if not 1 <= index <= count:
+        raise argparse.ArgumentTypeError(
+            "shard index %d out of range 1..%d" % (index, count))
+
+    return index - 1, count
+
+
+TEST_CASE_ORDERS = ['plan', 'failing-first', 'longest-first',
+                    'shortest-first']
+
+
+def estimate_durations(test_cases, history):
+    """Return dict of expected test case durations
+
+    Test cases without history are expected to take the mean duration of
+    the known ones.
+
+    history - dict of (mean duration, last result) tuples, as returned by
+              TestCaseTable.get_statistics
+    """
+    known = [history[tc][0] for tc in test_cases
+             if tc in history and history[tc][0] is not None]
+    default = sum(known) / len(known) if known else 0
+
+    durations = {}
+    for tc in test_cases:
+        duration = history.get(tc, (None, None))[0]
+        durations[tc] = default if duration is None else duration
+
+    return durations
+
+
+def order_test_cases(test_cases, order, history):
+    """Return test cases sorted in given order
+
+    order - one of TEST_CASE_ORDERS:
+            plan - keep the order of the PTS workspace
+            failing-first - test cases that did not pass last time go first,
+                            then the new ones, for early regression signal
+            longest-first - by descending mean duration
+            shortest-first - by ascending mean duration, for smoke runs
+    history - dict of (mean duration, last result) tuples, as returned by
+              TestCaseTable.get_statistics
+    """
+    if order == 'failing-first':
+        def failing_first(tc):
+            result = history.get(tc, (None, None))[1]
+            if result is None:
+                return 1
+            return 2 if result == 'PASS' else 0
+
+        return sorted(test_cases, key=failing_first)
+
+    if order == 'longest-first':
+        durations = estimate_durations(test_cases, history)
+        return sorted(test_cases, key=lambda tc: -durations[tc])
+
+    if order == 'shortest-first':
+        durations = estimate_durations(test_cases, history)
+        return sorted(test_cases, key=lambda tc: durations[tc])
+
+    return test_cases
+
+
+CHECKPOINT_FILE = "checkpoint.json"
+
+
+def save_checkpoint(session_log_dir, checkpoint):
+    """Persist session progress so that it can be resumed with --resume"""
+    path = os.path.join(session_log_dir, CHECKPOINT_FILE)
+    tmp_path = path + ".tmp"
+
+    with open(tmp_path, 'w') as f:
+        json.dump(checkpoint, f)
+
+    os.replace(tmp_path, path)
+
+
+def load_checkpoint(session_log_dir):
+    """Return checkpoint saved in session log directory or None"""
+    path = os.path.join(session_log_dir, CHECKPOINT_FILE)
+    if not os.path.exists(path):
+        return None
+
+    try:
+        with open(path, 'r') as f:
+            return json.load(f)
+    except (OSError, ValueError) as e:
+        logging.exception(e)
+        return None
+
+
 def run_test_cases(ptses, test_case_instances, args):
     """Runs a list of test cases"""
 
@@ -913,32 +1221,88 @@ def run_test_cases(ptses, test_case_instances, args):
 
         return True
 
-    ports_str = '_'.join(str(x) for x in args.cli_port)
-    now = datetime.datetime.now().strftime("%Y_%m_%d_%H_%M_%S")
-    session_log_dir = 'logs/cli_port_' + ports_str + '/' + now
-    try:
-        os.makedirs(session_log_dir)
-    except OSError as e:
-        if e.errno != errno.EEXIST:
-            raise
+    checkpoint = None
+    resume = getattr(args, 'resume', None)
+    TestCase.settle_timeout = getattr(args, 'settle_timeout',
+                                      TestCase.settle_timeout)
 
-    test_cases = []
+    if resume:
+        session_log_dir = resume
+        checkpoint = load_checkpoint(session_log_dir)
 
-    projects = ptses[0].get_project_list()
+    if checkpoint:
+        print("Resuming session %s" % session_log_dir)
+        projects = checkpoint["projects"]
+        test_cases = checkpoint["test_cases"]
+    else:
+        if not resume:
+            ports_str = '_'.join(str(x) for x in args.cli_port)
+            now = datetime.datetime.now().strftime("%Y_%m_%d_%H_%M_%S")
+            session_log_dir = 'logs/cli_port_' + ports_str + '/' + now
+
+        try:
+            os.makedirs(session_log_dir)
+        except OSError as e:
+            if e.errno != errno.EEXIST:
+                raise
 
-    for project in projects:
-        _test_case_list = ptses[0].get_test_case_list(project)
-        test_cases += [tc for tc in _test_case_list if run_or_not(tc)]
+        test_cases = []
+
+        catalogue = ptses[0].get_catalogue()
+        projects = list(catalogue.keys())
+
+        for project in projects:
+            test_cases += [tc for tc in catalogue[project] if run_or_not(tc)]
+
+        order = getattr(args, 'order', 'plan')
+        history = {}
+        if order != 'plan':
+            if TEST_CASE_DB:
+                history = TEST_CASE_DB.get_statistics(test_cases)
+            else:
+                print("No test case database, running in plan order")
+
+        shard = getattr(args, 'shard', None)
+        if shard:
+            durations = None
+            if order == 'longest-first' and history:
+                durations = estimate_durations(test_cases, history)
+
+            test_cases = get_shard(test_cases, test_case_instances, *shard,
+                                   durations=durations)
+
+        test_cases = order_test_cases(test_cases, order, history)
+
+        checkpoint = {
+            "projects": projects,
+            "test_cases": test_cases,
+            "finished": [],
+            "current": None,
+            "run_count": 0,
+        }
 
     # Statistics
-    stats = TestCaseRunStats(projects, test_cases, args.retry, TEST_CASE_DB)
+    stats = TestCaseRunStats(projects, test_cases, args.retry, TEST_CASE_DB,
+                             os.path.join(session_log_dir, "results.jsonl"))
 
     exceptions = queue.Queue()
+    finished = set(checkpoint["finished"])
 
     for test_case in test_cases:
-        stats.run_count = 0
+        if test_case in finished:
+            stats.index += 1
+            continue
+
+        if test_case == checkpoint["current"]:
+            stats.run_count = checkpoint["run_count"]
+        else:
+            stats.run_count = 0
 
         while True:
+            checkpoint["current"] = test_case
+            checkpoint["run_count"] = stats.run_count
+            save_checkpoint(session_log_dir, checkpoint)
+
             timeout = False
 
             if args.superguard:
@@ -989,8 +1353,15 @@ def run_test_cases(ptses, test_case_instances, args):
 
             stats.run_count += 1
 
+        checkpoint["finished"].append(test_case)
+        checkpoint["current"] = None
+        checkpoint["run_count"] = 0
+        save_checkpoint(session_log_dir, checkpoint)
+
         stats.index += 1
 
+    stats.close()
+    stats.export_xml(os.path.join(session_log_dir, "results.xml"))
     stats.print_summary()
 
     return stats.get_status_count(), stats.get_results(), stats.get_regressions()
@@ -1050,6 +1421,37 @@ class CliParser(argparse.ArgumentParser):
                           help="Specify if autoptsserver should try to recover"
                                " itself after exception.")
 
+        self.add_argument("--resume", metavar='SESSION_LOG_DIR', default=None,
+                          help="Resume interrupted test session from its "
+                               "log directory, e.g. logs/cli_port_65001/"
+                               "2020_01_01_00_00_00. Test cases already "
+                               "finished in that session are skipped.")
+
+        self.add_argument("--shard", metavar='INDEX/COUNT', default=None,
+                          type=parse_shard,
+                          help="Run only INDEX-th of COUNT parts of the test "
+                               "plan, so that COUNT clients, each with its "
+                               "own PTS and IUT, share the test plan. Test "
+                               "cases requiring a second lower tester are "
+                               "run by shard 1, which needs two PTS "
+                               "instances.")
+
+        self.add_argument("--order", choices=TEST_CASE_ORDERS,
+                          default='plan',
+                          help="Order of test cases, based on results and "
+                               "durations of previous runs stored in the "
+                               "test case database. With --shard, "
+                               "longest-first also balances shards by "
+                               "expected duration, so all shards have to be "
+                               "started with the same database.")
+
+        self.add_argument("--settle-timeout", default=TestCase.settle_timeout,
+                          metavar='SECONDS', type=float,
+                          help="Maximum time to let IUT and PTS settle down "
+                               "after each test case. Test cases that can "
+                               "tell they are settled do not wait that "
+                               "long.")
+
         self.add_argument("--superguard", default=0, metavar='MINUTES', type=float,
                           help="Specify amount of time in minutes, after which"
                                " super guard will blindly trigger recovery steps.")
@@ -1253,6 +1655,10 @@ def run_recovery(args, ptses):
     shutdown_pts(ptses)
     init_pts(ptses, args)
 
+    for pts in ptses:
+        if isinstance(pts, WorkspaceCache):
+            pts.invalidate()
+
     setup_project_pixits(ptses)
 
 
@@ -1261,11 +1667,42 @@ def setup_project_name(project):
     autoprojects = importlib.import_module('ptsprojects.' + project)
 
 
+class PixitBatch:
+    """PTS proxy wrapper collecting set_pixit calls
+
+    Collected PIXITs are applied with one set_pixits call per project on
+    flush. Other calls are passed to the wrapped proxy.
+
+    """
+
+    def __init__(self, pts):
+        self._pts = pts
+        self._pixits = {}
+
+    def __getattr__(self, name):
+        return getattr(self._pts, name)
+
+    def set_pixit(self, project_name, param_name, param_value):
+        self._pixits.setdefault(project_name, {})[param_name] = param_value
+
+    def flush(self):
+        for project_name, pixits in self._pixits.items():
+            log("Set %d PIXITs for project: %s", len(pixits), project_name)
+            self._pts.set_pixits(project_name, pixits)
+
+        self._pixits = {}
+
+
 def setup_project_pixits(ptses):
+    batches = [PixitBatch(pts) for pts in ptses]
+
     for profile in profiles:
         mod = getattr(autoprojects, profile, None)
         if mod is not None:
-            mod.set_pixits(ptses)
+            mod.set_pixits(batches)
+
+    for batch in batches:
+        batch.flush()
 
 
 def setup_test_cases(ptses):
@@ -35,11 +35,13 @@ import os
 import shutil
 import subprocess
 import sys
+import tempfile
 import threading
 import time
 import traceback
 import xmlrpc.client
 import xmlrpc.server
+import zipfile
 from os.path import dirname, abspath
 from queue import Queue
 from time import sleep
@@ -50,6 +52,7 @@ import winutils
 
 import ptscontrol
 from config import SERVER_PORT
+from utils import KeepAliveXMLRPCRequestHandler, PersistentTransport
 
 log = logging.debug
 PROJECT_DIR = dirname(abspath(__file__))
@@ -86,7 +89,7 @@ class PyPTSWithXmlRpcCallback(ptscontrol.PyPTS):
 
         self.client_xmlrpc_proxy = xmlrpc.client.ServerProxy(
             "http://{}:{}/".format(self.client_address, self.client_port),
-            allow_none=True)
+            transport=PersistentTransport(per_thread=True), allow_none=True)
 
         log("Created XMR RPC auto-pts client proxy, provides methods: %s" %
             self.client_xmlrpc_proxy.system.listMethods())
@@ -105,6 +108,16 @@ class PyPTSWithXmlRpcCallback(ptscontrol.PyPTS):
         self.client_xmlrpc_proxy = None
 
 
+class XmlRpcRequestHandler(KeepAliveXMLRPCRequestHandler):
+    """Keeps client connection open between requests
+
+    PTS has to be called from the thread that started it, so the server
+    handles one connection at a time. Idle connection is closed quickly to
+    not keep other clients waiting.
+    """
+    timeout = 5
+
+
 class SvrArgumentParser(argparse.ArgumentParser):
     def __init__(self, description):
         argparse.ArgumentParser.__init__(self, description=description)
@@ -153,6 +166,26 @@ def get_workspace(workspace):
     return None
 
 
+def is_excluded(name, excluded):
+    return bool(excluded) and (name in excluded or
+                               os.path.splitext(name)[1] in excluded)
+
+
+def scan_tree(root, excluded=None):
+    """Yields os.DirEntry of every file under root, skipping files and
+    directories directly in root with name or extension listed in excluded.
+    Test case logs in subdirectories are kept whole."""
+    with os.scandir(root) as it:
+        for entry in it:
+            if is_excluded(entry.name, excluded):
+                continue
+
+            if entry.is_dir():
+                yield from scan_tree(entry.path)
+            else:
+                yield entry
+
+
 def kill_all_processes(name):
     c = wmi.WMI()
     for ps in c.Win32_Process(name=name):
@@ -275,13 +308,23 @@ class Server(threading.Thread):
 
         print("Serving on port {} ...".format(_args.srv_port))
 
-        self.server = xmlrpc.server.SimpleXMLRPCServer(("", _args.srv_port), allow_none=True)
+        self.server = xmlrpc.server.SimpleXMLRPCServer(
+            ("", _args.srv_port), requestHandler=XmlRpcRequestHandler,
+            allow_none=True)
         self.server.register_function(self.request_recovery, 'request_recovery')
         self.server.register_function(self.list_workspace_tree, 'list_workspace_tree')
         self.server.register_function(self.copy_file, 'copy_file')
         self.server.register_function(self.delete_file, 'delete_file')
+        self.server.register_function(self.get_file_info, 'get_file_info')
+        self.server.register_function(self.read_file_chunk, 'read_file_chunk')
+        self.server.register_function(self.archive_workspace, 'archive_workspace')
+        self.server.register_function(self.get_workspace_manifest,
+                                      'get_workspace_manifest')
+        self.server.register_function(self.delete_workspace_logs,
+                                      'delete_workspace_logs')
         self.server.register_instance(self.pts)
         self.server.register_introspection_functions()
+        self.server.register_multicall_functions()
         self.server.serve_forever()
         self.server.server_close()
         return 0
@@ -336,6 +379,106 @@ class Server(threading.Thread):
         elif os.path.isdir(file_path):
             shutil.rmtree(file_path, ignore_errors=True)
 
+    def get_file_info(self, file_path):
+        """Returns size and SHA-256 hex digest of the file, None if there is
+        no such file. Size is a string, XML-RPC int is only 32 bits."""
+        if not os.path.isfile(file_path):
+            return None
+
+        return {"size": str(os.path.getsize(file_path)),
+                "sha256": ptscontrol.file_hash(file_path)}
+
+    def read_file_chunk(self, file_path, offset, size):
+        """Returns up to size bytes of the file starting at offset. Offset is
+        passed as a string, files may be bigger than XML-RPC int allows."""
+        with open(file_path, 'rb') as handle:
+            handle.seek(int(offset))
+            return xmlrpc.client.Binary(handle.read(size))
+
+    def get_workspace_manifest(self, workspace_dir, cursor=0, excluded=None):
+        """Returns files of workspace modified since cursor
+
+        Returns dictionary with list of [path, size, mtime] entries,
+        path being relative to workspace directory, and cursor to pass to the
+        next call to get only files modified after this one.
+        """
+        logs_root = get_workspace(workspace_dir)
+        next_cursor = time.time()
+        entries = []
+
+        for entry in scan_tree(logs_root, excluded):
+            # DirEntry.stat() does not need extra system call on Windows
+            stat = entry.stat()
+            if stat.st_mtime < cursor:
+                continue
+
+            # Size as string, XML-RPC int is only 32 bits
+            entries.append([os.path.relpath(entry.path, logs_root),
+                            str(stat.st_size), stat.st_mtime])
+
+        return {"cursor": next_cursor, "entries": entries}
+
+    def archive_workspace(self, workspace_dir, excluded, paths=None):
+        """Compresses workspace logs into a single zip file
+
+        Files and directories directly in workspace directory with name or
+        extension listed in excluded are skipped. If paths relative to workspace directory are given, only
+        those are compressed. Returns path of the zip file, to be removed with
+        delete_file once copied.
+        """
+        logs_root = get_workspace(workspace_dir)
+        fd, zip_path = tempfile.mkstemp(prefix=workspace_dir + '_',
+                                        suffix='.zip')
+        os.close(fd)
+
+        if paths is None:
+            paths = [os.path.relpath(entry.path, logs_root)
+                     for entry in scan_tree(logs_root, excluded)]
+
+        with zipfile.ZipFile(zip_path, 'w', zipfile.ZIP_DEFLATED) as zf:
+            for path in paths:
+                full_path = os.path.join(logs_root, path)
+                if os.path.isfile(full_path):
+                    zf.write(full_path, path)
+
+        return zip_path
+
+    def delete_workspace_logs(self, workspace_dir, paths):
+        """Removes given files, with paths relative to workspace directory,
+        and directories left empty. Workspace files are never removed, nor
+        logs written after the files were listed. Returns list of paths that
+        could not be removed, e.g. locked by PTS."""
+        logs_root = get_workspace(workspace_dir)
+        dirs = set()
+        failed = []
+
+        for path in paths:
+            full_path = os.path.join(logs_root, path)
+            if os.path.splitext(path)[1] in ['.pts', '.pqw6'] or \
+                    not os.path.isfile(full_path):
+                continue
+
+            try:
+                os.remove(full_path)
+            except OSError as e:
+                logging.exception(e)
+                failed.append(path)
+                continue
+
+            parent = os.path.dirname(path)
+            while parent:
+                dirs.add(parent)
+                parent = os.path.dirname(parent)
+
+        # Deepest first, so parents are empty once their children are gone
+        for path in sorted(dirs, key=len, reverse=True):
+            try:
+                os.rmdir(os.path.join(logs_root, path))
+            except OSError:
+                pass  # not empty
+
+        return failed
+
 
 def multi_main(_args, _queue, _superguard):
     """Multi server main."""
@@ -12,16 +12,24 @@
 # FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for
 # more details.
 #
+import hashlib
+import json
 import logging
 import os
+import queue
 import re
 import subprocess
 import sys
 import mimetypes
+import multiprocessing
 import shutil
 import zipfile
 import smtplib
 import datetime
+import sqlite3
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, \
+    as_completed
 from os.path import dirname, abspath
 from pathlib import Path
 from email.mime.multipart import MIMEMultipart
@@ -29,7 +37,7 @@ from email.mime.text import MIMEText
 from email.mime.base import MIMEBase
 from email import encoders
 
-from xmlrpc.client import ServerProxy
+from xmlrpc.client import ServerProxy, Error as XmlRpcError
 import git
 import yaml
 import xlsxwriter
@@ -39,15 +47,36 @@ from googleapiclient.http import MediaFileUpload
 from httplib2 import Http
 from oauth2client import file, client, tools
 
+from ptsprojects.testcase_db import DATABASE_FILE
+
 SCOPES = 'https://www.googleapis.com/auth/drive'
 CLIENT_SECRET_FILE = 'client_secret.json'
 REPORT_XLSX = "report.xlsx"
 REPORT_TXT = "report.txt"
 COMMASPACE = ', '
+DRIVE_FOLDER_MIME_TYPE = 'application/vnd.google-apps.folder'
+UPLOAD_WORKERS = 4
+UPLOAD_CHUNK_SIZE = 8 * 1024 * 1024
+UPLOAD_RETRIES = 5
 
 devices_in_use = []
 PROJECT_DIR = dirname(dirname(abspath(__file__)))
 
+# Workspace top level entries not uploaded, test case dirs are kept whole
+BPV_LOGS_EXCLUDED = ['SIGDatabase', 'logfiles', '.pqw6', '.xml', '.txt']
+FILE_CHUNK_SIZE = 4 * 1024 * 1024
+FILE_FETCH_RETRIES = 3
+BPV_LOGS_CURSORS_FILE = 'bpv_logs_cursors.json'
+PUBLISH_DIR = 'publish'
+
+ARCHIVE_COMPRESSIONS = {
+    'stored': zipfile.ZIP_STORED,
+    'deflate': zipfile.ZIP_DEFLATED,
+}
+# Available since Python 3.14
+if hasattr(zipfile, 'ZIP_ZSTANDARD'):
+    ARCHIVE_COMPRESSIONS['zstd'] = zipfile.ZIP_ZSTANDARD
+
 # ****************************************************************************
 # Mail
 # ****************************************************************************
@@ -166,6 +195,16 @@ def send_mail(cfg, subject, body, attachments=None):
 # ****************************************************************************
 # Google Drive
 # ****************************************************************************
+def file_md5(path):
+    md5 = hashlib.md5()
+
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            md5.update(chunk)
+
+    return md5.hexdigest()
+
+
 class GDrive:
     def __init__(self, cfg):
         self.basedir_id = cfg['root_directory_id']
@@ -181,8 +220,17 @@ class GDrive:
             flow = client.flow_from_clientsecrets(
                 os.path.join(path, CLIENT_SECRET_FILE), SCOPES)
             creds = tools.run_flow(flow, store)
-        self.service = discovery.build('drive', 'v3',
-                                       http=creds.authorize(Http()))
+        self._creds = creds
+        self._local = threading.local()
+
+    @property
+    def service(self):
+        # httplib2 is not thread safe, each thread needs its own service
+        if not hasattr(self._local, 'service'):
+            self._local.service = discovery.build(
+                'drive', 'v3', http=self._creds.authorize(Http()))
+
+        return self._local.service
 
     def pwd(self):
         return self.cwd_id
@@ -190,7 +238,7 @@ class GDrive:
     def mkdir(self, name):
         file_metadata = {
             'name': name,
-            'mimeType': 'application/vnd.google-apps.folder',
+            'mimeType': DRIVE_FOLDER_MIME_TYPE,
             'parents': [self.pwd()]
         }
 
@@ -203,16 +251,17 @@ class GDrive:
 
         return f
 
-    def ls(self):
+    def ls(self, dir_id=None):
         results = {}
 
         page_token = None
         while True:
             try:
                 response = self.service.files().list(
-                    q="'{}' in parents".format(self.pwd()),
+                    q="'{}' in parents".format(dir_id or self.pwd()),
                     spaces='drive',
-                    fields='nextPageToken, files(id, name)',
+                    fields='nextPageToken, '
+                           'files(id, name, mimeType, md5Checksum)',
                     pageToken=page_token).execute()
             except errors.HttpError:
                 sys.exit(1)
@@ -225,7 +274,7 @@ class GDrive:
 
         return results
 
-    def cp(self, name):
+    def cp(self, name, dir_id=None):
         if not os.path.exists(name):
             print("File not found")
             sys.exit(1)
@@ -235,18 +284,29 @@ class GDrive:
 
         file_metadata = {
             'name': basename,
-            'parents': [self.pwd()]
+            'parents': [dir_id or self.pwd()]
         }
 
+        # Large files are sent in chunks, failed chunks are resent
+        resumable = os.path.getsize(name) > UPLOAD_CHUNK_SIZE
         media = MediaFileUpload(
             name,
-            mimetype=mime_type)
+            mimetype=mime_type,
+            chunksize=UPLOAD_CHUNK_SIZE,
+            resumable=resumable)
 
         try:
-            f = self.service.files().create(
+            request = self.service.files().create(
                 body=file_metadata,
                 media_body=media,
-                fields='id, name').execute()
+                fields='id, name')
+
+            if not resumable:
+                return request.execute(num_retries=UPLOAD_RETRIES)
+
+            f = None
+            while f is None:
+                _, f = request.next_chunk(num_retries=UPLOAD_RETRIES)
         except errors.HttpError as err:
             print(err)
             sys.exit(1)
@@ -269,6 +329,17 @@ class Drive(GDrive):
     def __init__(self, cfg):
         GDrive.__init__(self, cfg)
         self.url = None
+        self._init_uploads()
+
+    def _init_uploads(self):
+        # Ids of created folders, see _get_dir
+        self._dirs = {}
+        self._uploaded = set()
+        # Content of remote folders, indexed by folder id and file name
+        self._remote_files = {}
+        self._remote_files_lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=UPLOAD_WORKERS)
+        self._pending = []
 
     def new_workdir(self, iut):
         files = self.ls()
@@ -281,12 +352,85 @@ class Drive(GDrive):
         self.cd(dir_)
         return "{}".format(dir_.get('webViewLink'))
 
-    def upload(self, f):
+    def _ls_cached(self, dir_id):
+        with self._remote_files_lock:
+            if dir_id not in self._remote_files:
+                self._remote_files[dir_id] = self.ls(dir_id)
+
+            return self._remote_files[dir_id]
+
+    def _is_uploaded(self, f, dir_id):
+        """Check if remote folder already has the same file"""
+        remote = self._ls_cached(dir_id).get(os.path.basename(f), {})
+        md5 = remote.get('md5Checksum')
+
+        return md5 is not None and md5 == file_md5(f)
+
+    def _upload(self, f, dir_id):
+        if self._is_uploaded(f, dir_id):
+            print("Skipping {}, already uploaded".format(f))
+            return
+
         print("Uploading {} ...".format(f))
-        self.cp(f)
+        self.cp(f, dir_id)
         print("Done")
 
+    def upload(self, f):
+        self._upload(f, self.pwd())
+
+    def wait_uploads(self):
+        """Wait for uploads started with upload_file"""
+        pending, self._pending = self._pending, []
+
+        for future in pending:
+            future.result()
+
+    def _get_dir(self, workdir, folder, rel_dir):
+        """Return id of folder mirroring rel_dir of local folder in workdir,
+        creating it and its parents if needed"""
+        key = (workdir, os.path.abspath(folder), rel_dir)
+
+        if key not in self._dirs:
+            if not rel_dir:
+                self._dirs[key] = workdir
+            else:
+                parent, name = os.path.split(rel_dir)
+                parent_id = self._get_dir(workdir, folder, parent)
+
+                # Reuse folder left by previous upload to the same workdir
+                remote = self._ls_cached(parent_id).get(name)
+                if remote and remote.get('mimeType') == DRIVE_FOLDER_MIME_TYPE:
+                    self._dirs[key] = remote.get('id')
+                else:
+                    self.cd(parent_id)
+                    dir_ = self.mkdir(name)
+                    self.cd(workdir)
+
+                    with self._remote_files_lock:
+                        self._remote_files[parent_id][name] = dir_
+                        self._remote_files[dir_.get('id')] = {}
+                    self._dirs[key] = dir_.get('id')
+
+        return self._dirs[key]
+
+    def upload_file(self, folder, path):
+        """Start upload of file located in local folder to the same location
+        in current directory, see wait_uploads"""
+        rel_dir = os.path.relpath(os.path.dirname(os.path.abspath(path)),
+                                  os.path.abspath(folder))
+        if rel_dir == os.curdir:
+            rel_dir = ''
+
+        dir_id = self._get_dir(self.pwd(), folder, rel_dir)
+        self._uploaded.add(os.path.abspath(path))
+        self._pending.append(self._executor.submit(
+            self._upload, os.path.relpath(path), dir_id))
+
     def upload_folder(self, folder, excluded=None):
+        """Upload content of folder to current directory, skipping files
+        already uploaded with upload_file"""
+        workdir = self.pwd()
+
         def recursive(directory):
             with os.scandir(directory) as it:
                 for f in it:
@@ -294,17 +438,68 @@ class Drive(GDrive):
                                      os.path.splitext(f.name)[1] in excluded):
                         continue
 
+                    path = os.path.join(directory, f.name)
                     if f.is_dir():
-                        parent = self.pwd()
-                        dir_ = self.mkdir(f.name)
-                        self.cd(dir_)
-                        recursive(os.path.join(directory, f.name))
-                        self.cd(parent)
-                    else:
-                        filepath = os.path.relpath(os.path.join(directory, f.name))
-                        self.upload(filepath)
+                        self._get_dir(workdir, folder,
+                                      os.path.relpath(path, folder))
+                        recursive(path)
+                    elif os.path.abspath(path) not in self._uploaded:
+                        self.upload_file(folder, path)
 
         recursive(folder)
+        self.wait_uploads()
+
+
+class LocalDrive(Drive):
+    """Drive stand-in keeping uploaded files in local directory, for testing
+
+    Enabled with 'local_directory' in the gdrive configuration.
+    """
+
+    def __init__(self, cfg):
+        self.basedir_id = os.path.abspath(cfg['local_directory'])
+        self.cwd_id = self.basedir_id
+        self.url = None
+        self._init_uploads()
+
+        os.makedirs(self.basedir_id, exist_ok=True)
+
+    def mkdir(self, name):
+        path = os.path.join(self.pwd(), name)
+        os.makedirs(path, exist_ok=True)
+
+        return {'id': path, 'name': name, 'webViewLink': path,
+                'mimeType': DRIVE_FOLDER_MIME_TYPE}
+
+    def ls(self, dir_id=None):
+        results = {}
+
+        with os.scandir(dir_id or self.pwd()) as it:
+            for f in it:
+                results[f.name] = {'id': f.path, 'name': f.name}
+                if f.is_dir():
+                    results[f.name]['mimeType'] = DRIVE_FOLDER_MIME_TYPE
+                else:
+                    results[f.name]['md5Checksum'] = file_md5(f.path)
+
+        return results
+
+    def cp(self, name, dir_id=None):
+        if not os.path.exists(name):
+            print("File not found")
+            sys.exit(1)
+
+        path = shutil.copy(name, dir_id or self.pwd())
+
+        return {'id': path, 'name': os.path.basename(path)}
+
+
+def get_drive(cfg):
+    """Return Drive for gdrive configuration"""
+    if 'local_directory' in cfg:
+        return LocalDrive(cfg)
+
+    return Drive(cfg)
 
 
 # ****************************************************************************
@@ -438,98 +633,276 @@ def make_report_txt(results_dict, zephyr_hash):
 # ****************************************************************************
 # Miscellaneous
 # ****************************************************************************
-def archive_recursive(dir_path):
+def parse_compression(compression):
+    """Parse NAME[:LEVEL] archive compression into (method, level) tuple
+    :param compression: one of ARCHIVE_COMPRESSIONS names, optionally with
+    compression level, e.g. 'deflate:1'
+    """
+    name, _, level = compression.partition(':')
+
+    if name not in ARCHIVE_COMPRESSIONS:
+        raise ValueError("Unsupported archive compression %r, use one of: %s"
+                         % (name, COMMASPACE.join(ARCHIVE_COMPRESSIONS)))
+
+    return ARCHIVE_COMPRESSIONS[name], int(level) if level else None
+
+
+def archive_recursive(dir_path, compression=zipfile.ZIP_STORED,
+                      compresslevel=None):
     """Archive directory recursively
     :return: newly created zip file path
     """
     zip_file_path = os.path.join(os.path.dirname(dir_path),
                                  os.path.basename(dir_path) + '.zip')
-    with zipfile.ZipFile(zip_file_path, 'w', allowZip64=True) as zf:
+    with zipfile.ZipFile(zip_file_path, 'w', compression=compression,
+                         compresslevel=compresslevel,
+                         allowZip64=True) as zf:
         for root, dirs, files in os.walk(dir_path):
-            for file_or_dir in files + dirs:
+            # Directories are implied by paths of the files
+            for name in files:
                 zf.write(
-                    os.path.join(root, file_or_dir),
-                    os.path.relpath(os.path.join(root, file_or_dir),
+                    os.path.join(root, name),
+                    os.path.relpath(os.path.join(root, name),
                                     os.path.join(dir_path, os.path.pardir)))
 
     return zip_file_path
 
 
-def archive_testcases(dir_path, depth=3):
+def archive_testcases(dir_path, depth=3, compression='stored', excluded=None,
+                      on_archived=None):
+    """Archive each test case directory found depth levels below dir_path.
+    Directories are compressed in parallel processes and removed once
+    archived.
+    :param compression: NAME[:LEVEL], see parse_compression
+    :param excluded: names and extensions of directories not to archive
+    :param on_archived: called with path of each zip file as soon as it is
+    created, e.g. to upload it while others are still being compressed
+    :return: dir_path
+    """
+    method, level = parse_compression(compression)
+
     def recursive(directory, depth):
         depth -= 1
         with os.scandir(directory) as it:
             for f in it:
+                if excluded and (f.name in excluded or
+                                 os.path.splitext(f.name)[1] in excluded):
+                    continue
+
                 if f.is_dir():
                     if depth > 0:
-                        recursive(os.path.join(directory, f.name), depth)
+                        yield from recursive(os.path.join(directory, f.name),
+                                             depth)
                     else:
-                        filepath = os.path.relpath(os.path.join(directory, f.name))
-                        archive_recursive(filepath)
-                        shutil.rmtree(filepath)
+                        yield os.path.relpath(os.path.join(directory, f.name))
+
+    test_case_dirs = list(recursive(dir_path, depth))
+    if not test_case_dirs:
+        return dir_path
+
+    # Called from the publisher thread, forking a multithreaded process
+    # could copy a lock held by another thread, so spawn the workers
+    with ProcessPoolExecutor(
+            mp_context=multiprocessing.get_context('spawn')) as executor:
+        futures = {executor.submit(archive_recursive, path, method, level):
+                   path for path in test_case_dirs}
+
+        for future in as_completed(futures):
+            zip_file_path = future.result()
+            shutil.rmtree(futures[future])
+
+            if on_archived:
+                on_archived(zip_file_path)
 
-    recursive(dir_path, depth)
     return dir_path
 
 
-def upload_bpv_logs(gdrive, args):
-    """Copy Bluetooth Protocol Viewer logs from auto-pts servers.
-    :param gdrive: to upload the logs
-    :param server_addr: list of servers addresses
-    :param server_port: list of servers ports
+def fetch_file(proxy, remote_path, local_path, chunk_size=FILE_CHUNK_SIZE,
+               retries=FILE_FETCH_RETRIES):
+    """Copy file from auto-pts server in chunks and verify its checksum.
+    Failed chunk reads are retried, transfer continues from the last received
+    chunk.
+    :param proxy: auto-pts server proxy
+    :param remote_path: path of the file on the server
+    :param local_path: destination path
+    :return: True if file was copied, False if there is no such file
     """
-    excluded = ['SIGDatabase', 'logfiles', '.pqw6', '.xml', '.txt']
-    logs_folder = 'tmp/' + args.workspace
+    info = proxy.get_file_info(remote_path)
+    if info is None:
+        return False
+
+    # Sizes and offsets are strings, XML-RPC int is only 32 bits
+    size = int(info['size'])
+    sha = hashlib.sha256()
+    offset = 0
+    failures = 0
+
+    with open(local_path, 'wb') as handle:
+        while offset < size:
+            try:
+                chunk = proxy.read_file_chunk(remote_path, str(offset),
+                                              chunk_size).data
+            except (OSError, XmlRpcError) as e:
+                failures += 1
+                if failures > retries:
+                    raise
+                logging.exception(e)
+                continue
 
+            if not chunk:
+                break
+
+            handle.write(chunk)
+            sha.update(chunk)
+            offset += len(chunk)
+
+    if sha.hexdigest() != info['sha256']:
+        raise Exception("Checksum mismatch of copied file %s" % remote_path)
+
+    return True
+
+
+def load_bpv_logs_cursors():
+    try:
+        with open(BPV_LOGS_CURSORS_FILE, 'r') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+    except (OSError, ValueError) as e:
+        logging.exception(e)
+        return {}
+
+
+def save_bpv_logs_cursors(cursors):
+    tmp_path = BPV_LOGS_CURSORS_FILE + '.tmp'
+
+    with open(tmp_path, 'w') as f:
+        json.dump(cursors, f)
+
+    os.replace(tmp_path, BPV_LOGS_CURSORS_FILE)
+
+
+def fetch_bpv_logs(server_addr, server_port, workspace, logs_folder,
+                   extract_lock, cursor=0):
+    """Copy Bluetooth Protocol Viewer logs from single auto-pts server.
+    Only logs modified since cursor are compressed by the server and pulled
+    as one zip file. Logs are left on the server, see delete_fetched_bpv_logs.
+    :return: (cursor to pass on the next call, list of fetched paths)
+    """
+    with ServerProxy("http://{}:{}/".format(server_addr, server_port),
+                     allow_none=True,) as proxy:
+        manifest = proxy.get_workspace_manifest(workspace, cursor,
+                                                BPV_LOGS_EXCLUDED)
+        paths = [entry[0] for entry in manifest['entries']]
+        if not paths:
+            return manifest['cursor'], []
+
+        zip_path = proxy.archive_workspace(workspace, BPV_LOGS_EXCLUDED,
+                                           paths)
+        local_zip = '{}_{}_{}.zip'.format(logs_folder, server_addr,
+                                          server_port)
+
+        try:
+            if not fetch_file(proxy, zip_path, local_zip):
+                return cursor, []
+        finally:
+            proxy.delete_file(zip_path)
+
+    with extract_lock, zipfile.ZipFile(local_zip) as zf:
+        zf.extractall(logs_folder)
+
+    os.remove(local_zip)
+
+    return manifest['cursor'], paths
+
+
+def delete_fetched_bpv_logs(server_addr, server_port, workspace, paths):
+    """Remove logs copied with fetch_bpv_logs from auto-pts server"""
+    with ServerProxy("http://{}:{}/".format(server_addr, server_port),
+                     allow_none=True,) as proxy:
+        failed = proxy.delete_workspace_logs(workspace, paths)
+
+    if failed:
+        logging.warning("Could not remove %d BPV logs from %s: %s",
+                        len(failed), server_addr, COMMASPACE.join(failed))
+
+
+def collect_bpv_logs(args, logs_folder):
+    """Copy Bluetooth Protocol Viewer logs from auto-pts servers and remove
+    them from the servers.
+    :param args: auto-pts client arguments with servers addresses and ports
+    :param logs_folder: destination directory
+    :return: logs_folder
+    """
     shutil.rmtree(logs_folder, ignore_errors=True)
 
     if sys.platform == 'win32':
         workspace_path = get_workspace(args.workspace)
         shutil.copytree(workspace_path, logs_folder)
-        archive_testcases(logs_folder, depth=3)
-        gdrive.upload_folder(logs_folder, excluded=excluded)
         delete_bpv_logs(workspace_path)
-        return
+        return logs_folder
 
-    server_addr = args.ip_addr
-    server_port = args.srv_port
+    servers = []
+    for addr, port in zip(args.ip_addr, args.srv_port):
+        # Servers on the same host share the workspace
+        if addr not in [server[0] for server in servers]:
+            servers.append((addr, port))
 
-    for i in range(len(server_addr)):
-        if i != 0 and server_addr[i] in server_addr[0:i]:
-            continue
+    Path(logs_folder).parent.mkdir(parents=True, exist_ok=True)
+    extract_lock = threading.Lock()
+    cursors = load_bpv_logs_cursors()
+
+    def cursor_key(addr):
+        return '{}/{}'.format(addr, args.workspace)
 
-        with ServerProxy("http://{}:{}/".format(server_addr[i], server_port[i]),
-                         allow_none=True,) as proxy:
-            file_list = proxy.list_workspace_tree(args.workspace)
-            if len(file_list) == 0:
+    fetched = []
+
+    # Each server is single threaded, so fetch from all of them in parallel
+    with ThreadPoolExecutor(max_workers=max(len(servers), 1)) as executor:
+        futures = [executor.submit(fetch_bpv_logs, addr, port, args.workspace,
+                                   logs_folder, extract_lock,
+                                   cursors.get(cursor_key(addr), 0))
+                   for addr, port in servers]
+
+        for (addr, port), future in zip(servers, futures):
+            try:
+                cursors[cursor_key(addr)], paths = future.result()
+            except BaseException as e:
+                logging.exception(e)
                 continue
 
-            workspace_root = file_list.pop()
-            while len(file_list) > 0:
-                file_path = file_list.pop(0)
-                try:
-                    file_bin = proxy.copy_file(file_path)
+            if paths:
+                fetched.append((addr, port, paths))
 
-                    if not os.path.splitext(file_path)[1] in ['.pts', '.pqw6']:
-                        proxy.delete_file(file_path)
+        # Logs are extracted and cursors saved, only now remove them from
+        # the servers
+        save_bpv_logs_cursors(cursors)
 
-                    if file_bin is None:
-                        continue
+        futures = [executor.submit(delete_fetched_bpv_logs, addr, port,
+                                   args.workspace, paths)
+                   for addr, port, paths in fetched]
 
-                    file_path = '/'.join([logs_folder,
-                                          file_path[len(workspace_root) + 1:]
-                                          .replace('\\', '/')])
-                    Path(os.path.dirname(file_path)).mkdir(parents=True,
-                                                           exist_ok=True)
+        for future in futures:
+            try:
+                future.result()
+            except BaseException as e:
+                logging.exception(e)
+
+    return logs_folder
 
-                    with open(file_path, 'wb') as handle:
-                        handle.write(file_bin.data)
-                except BaseException as e:
-                    logging.exception(e)
 
-    if os.path.exists(logs_folder):
-        archive_testcases(logs_folder, depth=3)
-        gdrive.upload_folder(logs_folder, excluded=excluded)
+def upload_bpv_logs(gdrive, logs_folder):
+    """Upload Bluetooth Protocol Viewer logs copied with collect_bpv_logs.
+    :param gdrive: to upload the logs
+    :param logs_folder: directory with the logs
+    """
+    if not os.path.exists(logs_folder):
+        return
+
+    archive_testcases(logs_folder, depth=3, excluded=BPV_LOGS_EXCLUDED,
+                      on_archived=lambda path: gdrive.upload_file(logs_folder,
+                                                                  path))
+    gdrive.upload_folder(logs_folder, excluded=BPV_LOGS_EXCLUDED)
 
 
 def get_workspace(workspace):
@@ -677,6 +1050,80 @@ def pre_cleanup():
         pass
 
 
+def stage_session(name):
+    """Move logs of finished test session out of the way of the next session
+    :param name: session name, e.g. board name
+    :return: directory with session logs and test case database snapshot
+    """
+    session_dir = os.path.join(
+        PUBLISH_DIR, '{}_{}'.format(
+            name, datetime.datetime.now().strftime("%Y_%m_%d_%H_%M_%S")))
+    os.makedirs(session_dir)
+
+    if os.path.exists("logs"):
+        shutil.move("logs", os.path.join(session_dir, "logs"))
+
+    if os.path.exists(DATABASE_FILE):
+        src = sqlite3.connect(DATABASE_FILE)
+        dst = sqlite3.connect(os.path.join(session_dir, DATABASE_FILE))
+        src.backup(dst)
+        dst.close()
+        src.close()
+
+    return session_dir
+
+
+def unstage_session(session_dir):
+    """Remove published session, keeping its logs in oldlogs
+    :param session_dir: directory returned by stage_session
+    """
+    logs_folder = os.path.join(session_dir, "logs")
+
+    try:
+        if os.path.exists(logs_folder):
+            shutil.copytree(logs_folder, "oldlogs", dirs_exist_ok=True)
+        shutil.rmtree(session_dir)
+    except OSError:
+        pass
+
+
+class Publisher:
+    """Publishes finished test sessions in background thread
+
+    Reports, log uploads and mails are handled one session at a time, while
+    the next test session is already running.
+    """
+
+    def __init__(self):
+        self._queue = queue.Queue()
+        self._thread = None
+
+    def _run(self):
+        while True:
+            func, args = self._queue.get()
+            try:
+                func(*args)
+            except BaseException as e:
+                logging.exception(e)
+            finally:
+                self._queue.task_done()
+
+    def put(self, func, *args):
+        """Queue func(*args) to be called in the background"""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+
+        self._queue.put((func, args))
+
+    def wait(self):
+        """Wait until all queued sessions are published"""
+        self._queue.join()
+
+
+publisher = Publisher()
+
+
 def cleanup():
     """Perform cleanup
     :return: None
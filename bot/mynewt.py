@@ -14,9 +14,11 @@
 # FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for
 # more details.
 #
+import copy
 import datetime
 import logging
 import os
+import shutil
 import subprocess
 import sys
 import time
@@ -28,6 +30,7 @@ from pybtp import btp
 from ptsprojects.mynewt.iutctl import get_iut
 
 import bot.common
+from ptsprojects.testcase_db import DATABASE_FILE
 
 
 def check_call(cmd, env=None, cwd=None, shell=True):
@@ -197,6 +200,13 @@ class PtsInitArgs:
         self.ykush = args.get('ykush', None)
         self.recovery = args.get('recovery', False)
         self.superguard = 60 * float(args.get('superguard', 0))
+        self.settle_timeout = float(args.get('settle_timeout', 3))
+        self.board = args.get('board', None)
+        self.commit = args.get('commit', None)
+        self.order = args.get('order', 'plan')
+        self.shard = None
+        if 'shard' in args:
+            self.shard = autoptsclient.parse_shard(args['shard'])
 
 
 def run_tests(args, iut_config):
@@ -288,10 +298,16 @@ def run_tests(args, iut_config):
         results.update(results_dict)
         autoprojects.iutctl.cleanup()
 
+    catalogue = pts.get_catalogue()
+
     for test_case_name in list(results.keys()):
         project_name = test_case_name.split('/')[0]
-        descriptions[test_case_name] = \
-            pts.get_test_case_description(project_name, test_case_name)
+        entry = catalogue.get(project_name, {}).get(test_case_name)
+        if entry:
+            descriptions[test_case_name] = entry["description"]
+        else:
+            descriptions[test_case_name] = \
+                pts.get_test_case_description(project_name, test_case_name)
 
     autoptsclient.shutdown_pts(ptses)
 
@@ -329,40 +345,38 @@ def compose_mail(args, mail_cfg, mail_ctx):
     return subject, body
 
 
-def main(cfg):
-    print("Mynewt bot start!")
-
-    bot.common.pre_cleanup()
-
-    start_time = time.time()
-
+def publish(cfg, session_dir, repo_status, build_info_file, summary, results,
+            descriptions, regressions, elapsed_time):
+    """Make reports, upload logs and send mail of finished test session
+    :param session_dir: directory returned by bot.common.stage_session
+    :param elapsed_time: duration of the session in seconds
+    """
     args = cfg['auto_pts']
 
-    repos_info = bot.common.update_repos(args['project_path'], cfg["git"])
-    repo_status = make_repo_status(repos_info)
-
-    summary, results, descriptions, regressions = \
-        run_tests(args, cfg.get('iut_config', {}))
-
     report_file = bot.common.make_report_xlsx(results, summary, regressions,
                                               descriptions)
     report_txt = bot.common.make_report_txt(results, repo_status)
-    logs_folder = bot.common.archive_testcases("logs")
+    logs_folder = os.path.join(session_dir, "logs")
+    compression = args.get('archive_compression', 'stored')
 
-    build_info_file = get_build_info_file(os.path.abspath(args['project_path']))
-
-    end_time = time.time()
     url = None
 
     if 'gdrive' in cfg:
-        drive = bot.common.Drive(cfg['gdrive'])
+        drive = bot.common.get_drive(cfg['gdrive'])
         url = drive.new_workdir(args['board'])
         drive.upload(report_file)
         drive.upload(report_txt)
+        # Upload archives while the remaining ones are being compressed
+        bot.common.archive_testcases(
+            logs_folder, compression=compression,
+            on_archived=lambda path: drive.upload_file(logs_folder, path))
         drive.upload_folder(logs_folder)
         drive.upload(build_info_file)
-        drive.upload("TestCase.db")
-        bot.common.upload_bpv_logs(drive, PtsInitArgs(args))
+        drive.upload(os.path.join(session_dir, DATABASE_FILE))
+        bot.common.upload_bpv_logs(drive,
+                                   os.path.join(session_dir, 'bpv_logs'))
+    else:
+        bot.common.archive_testcases(logs_folder, compression=compression)
 
     if 'mail' in cfg:
         print("Sending email ...")
@@ -385,7 +399,7 @@ def main(cfg):
 
         # Elapsed Time
         mail_ctx["elapsed_time"] = str(datetime.timedelta(
-                                       seconds=(end_time - start_time)))
+                                       seconds=elapsed_time))
 
         subject, body = compose_mail(args, cfg['mail'], mail_ctx)
 
@@ -394,6 +408,43 @@ def main(cfg):
 
         print("Done")
 
+    bot.common.unstage_session(session_dir)
+
+
+def main(cfg):
+    print("Mynewt bot start!")
+
+    bot.common.pre_cleanup()
+
+    start_time = time.time()
+
+    args = cfg['auto_pts']
+
+    repos_info = bot.common.update_repos(args['project_path'], cfg["git"])
+    repo_status = make_repo_status(repos_info)
+    args['commit'] = repo_status
+
+    summary, results, descriptions, regressions = \
+        run_tests(args, cfg.get('iut_config', {}))
+
+    # Build info is gathered before the next session updates the sources
+    build_info_file = get_build_info_file(os.path.abspath(args['project_path']))
+
+    # Move session logs out of the way of the next session and publish
+    # them in the background
+    session_dir = bot.common.stage_session(args['board'])
+    build_info_file = shutil.move(build_info_file, session_dir)
+    if 'gdrive' in cfg:
+        # PTS servers are used by the next session, get their logs now
+        bot.common.collect_bpv_logs(PtsInitArgs(args),
+                                    os.path.join(session_dir, 'bpv_logs'))
+
+    end_time = time.time()
+
+    bot.common.publisher.put(publish, copy.deepcopy(cfg), session_dir,
+                             repo_status, build_info_file, summary, results,
+                             descriptions, regressions, end_time - start_time)
+
     bot.common.cleanup()
 
     print("\nBye!")
@@ -16,6 +16,7 @@
 #
 
 import collections
+import copy
 import datetime
 import logging
 import os
@@ -25,14 +26,18 @@ import time
 from argparse import Namespace
 from git import Repo
 
-import serial
-
-from pybtp import btp
+from pybtp import btp, iutctl_common
 import autoptsclient_common as autoptsclient
 import ptsprojects.stack as stack
 import ptsprojects.zephyr as autoprojects
 from ptsprojects.zephyr.iutctl import get_iut
 import bot.common
+from ptsprojects.testcase_db import DATABASE_FILE
+
+# IUT is considered booted after flashing, once it stopped sending on serial
+# port for BOOT_QUIET_TIME seconds, but no later than after BOOT_TIMEOUT
+BOOT_QUIET_TIME = 1
+BOOT_TIMEOUT = 10
 
 
 def check_call(cmd, env=None, cwd=None, shell=True):
@@ -104,7 +109,8 @@ def build_and_flash(zephyr_wd, board, jlink_srn, conf_file=None):
 
 
 def flush_serial(tty):
-    """Clear the serial port buffer
+    """Clear the serial port buffer, waits until IUT has booted after flashing
+    i.e. stopped sending for BOOT_QUIET_TIME
     :param tty: file path of the terminal
     :return: None
     """
@@ -112,13 +118,10 @@ def flush_serial(tty):
         return
 
     if sys.platform == 'win32':
-        com = "COM" + str(int(tty["/dev/ttyS".__len__():]) + 1)
-        ser = serial.Serial(com, 115200, timeout=5)
-        ser.flushInput()
-        ser.flushOutput()
-    else:
-        check_call(['while', 'read', '-t', '0', 'var', '<', tty, ';', 'do',
-                    'continue;', 'done'])
+        tty = "COM" + str(int(tty["/dev/ttyS".__len__():]) + 1)
+
+    iutctl_common.flush_serial(tty, quiet_time=BOOT_QUIET_TIME,
+                               timeout=BOOT_TIMEOUT)
 
 
 def apply_overlay(zephyr_wd, base_conf, cfg_name, overlay):
@@ -198,6 +201,13 @@ class PtsInitArgs:
         self.ykush = args.get('ykush', None)
         self.recovery = args.get('recovery', False)
         self.superguard = 60 * float(args.get('superguard', 0))
+        self.settle_timeout = float(args.get('settle_timeout', 3))
+        self.board = args.get('board', None)
+        self.commit = args.get('commit', None)
+        self.order = args.get('order', 'plan')
+        self.shard = None
+        if 'shard' in args:
+            self.shard = autoptsclient.parse_shard(args['shard'])
 
 
 def run_tests(args, iut_config, tty, jlink_srn):
@@ -270,12 +280,13 @@ def run_tests(args, iut_config, tty, jlink_srn):
         logging.debug("TTY path: %s", tty)
 
         flush_serial(tty)
-        time.sleep(10)
 
         autoprojects.iutctl.init(Namespace(kernel_image=args["kernel_image"],
                                            tty_file=tty, board=args["board"],
                                            jlink_srn=jlink_srn, hci=None,
-                                           rtt2pty=args["rtt2pty"]))
+                                           rtt2pty=args["rtt2pty"],
+                                           warm_reset=args.get('warm_reset',
+                                                               False)))
 
         # Setup project PIXITS
         autoptsclient.setup_project_name('zephyr')
@@ -296,10 +307,16 @@ def run_tests(args, iut_config, tty, jlink_srn):
         results.update(results_dict)
         autoprojects.iutctl.cleanup()
 
+    catalogue = pts.get_catalogue()
+
     for test_case_name in list(results.keys()):
         project_name = test_case_name.split('/')[0]
-        descriptions[test_case_name] = \
-            pts.get_test_case_description(project_name, test_case_name)
+        entry = catalogue.get(project_name, {}).get(test_case_name)
+        if entry:
+            descriptions[test_case_name] = entry["description"]
+        else:
+            descriptions[test_case_name] = \
+                pts.get_test_case_description(project_name, test_case_name)
 
     autoptsclient.shutdown_pts(ptses)
 
@@ -355,52 +372,37 @@ def compose_mail(args, mail_cfg, mail_ctx):
     return subject, body
 
 
-def main(cfg):
-
-    bot.common.pre_cleanup()
-
-    start_time = time.time()
-
+def publish(cfg, session_dir, zephyr_hash, summary, results, descriptions,
+            regressions, elapsed_time):
+    """Make reports, upload logs and send mail of finished test session
+    :param session_dir: directory returned by bot.common.stage_session
+    :param elapsed_time: duration of the session in seconds
+    """
     args = cfg['auto_pts']
-    args['kernel_image'] = os.path.join(args['project_path'], 'tests',
-                                        'bluetooth', 'tester', 'outdir',
-                                        'zephyr', 'zephyr.elf')
-
-    zephyr_hash = bot.common.update_repos(args['project_path'],
-                                          cfg["git"])['zephyr']
-
-    if 'ykush' in args:
-        autoptsclient.board_power(args['ykush'], True)
-        time.sleep(1)
-
-    tty, jlink_srn = bot.common.get_free_device(args['board'])
-
-    try:
-        summary, results, descriptions, regressions = \
-            run_tests(args, cfg.get('iut_config', {}), tty, jlink_srn)
-    except Exception as e:
-        bot.common.release_device(jlink_srn)
-        raise e
-
-    bot.common.release_device(jlink_srn)
-    results = collections.OrderedDict(sorted(results.items()))
 
     report_file = bot.common.make_report_xlsx(results, summary, regressions,
                                               descriptions)
     report_txt = bot.common.make_report_txt(results, zephyr_hash["desc"])
-    logs_folder = bot.common.archive_testcases("logs")
+    logs_folder = os.path.join(session_dir, "logs")
+    compression = args.get('archive_compression', 'stored')
 
-    end_time = time.time()
     url = None
 
     if 'gdrive' in cfg:
-        drive = bot.common.Drive(cfg['gdrive'])
+        drive = bot.common.get_drive(cfg['gdrive'])
         url = drive.new_workdir(args['board'])
         drive.upload(report_file)
         drive.upload(report_txt)
+        # Upload archives while the remaining ones are being compressed
+        bot.common.archive_testcases(
+            logs_folder, compression=compression,
+            on_archived=lambda path: drive.upload_file(logs_folder, path))
         drive.upload_folder(logs_folder)
-        drive.upload("TestCase.db")
-        bot.common.upload_bpv_logs(drive, PtsInitArgs(args))
+        drive.upload(os.path.join(session_dir, DATABASE_FILE))
+        bot.common.upload_bpv_logs(drive,
+                                   os.path.join(session_dir, 'bpv_logs'))
+    else:
+        bot.common.archive_testcases(logs_folder, compression=compression)
 
     if 'mail' in cfg:
         print("Sending email ...")
@@ -431,7 +433,7 @@ def main(cfg):
 
         # Elapsed Time
         mail_ctx["elapsed_time"] = str(datetime.timedelta(
-                                       seconds=(end_time - start_time)))
+                                       seconds=elapsed_time))
 
         subject, body = compose_mail(args, cfg['mail'], mail_ctx)
 
@@ -440,6 +442,54 @@ def main(cfg):
 
         print("Done")
 
+    bot.common.unstage_session(session_dir)
+
+
+def main(cfg):
+
+    bot.common.pre_cleanup()
+
+    start_time = time.time()
+
+    args = cfg['auto_pts']
+    args['kernel_image'] = os.path.join(args['project_path'], 'tests',
+                                        'bluetooth', 'tester', 'outdir',
+                                        'zephyr', 'zephyr.elf')
+
+    zephyr_hash = bot.common.update_repos(args['project_path'],
+                                          cfg["git"])['zephyr']
+    args['commit'] = zephyr_hash['commit']
+
+    if 'ykush' in args:
+        autoptsclient.board_power(args['ykush'], True)
+        time.sleep(1)
+
+    tty, jlink_srn = bot.common.get_free_device(args['board'])
+
+    try:
+        summary, results, descriptions, regressions = \
+            run_tests(args, cfg.get('iut_config', {}), tty, jlink_srn)
+    except Exception as e:
+        bot.common.release_device(jlink_srn)
+        raise e
+
+    bot.common.release_device(jlink_srn)
+    results = collections.OrderedDict(sorted(results.items()))
+
+    # Move session logs out of the way of the next session and publish
+    # them in the background
+    session_dir = bot.common.stage_session(args['board'])
+    if 'gdrive' in cfg:
+        # PTS servers are used by the next session, get their logs now
+        bot.common.collect_bpv_logs(PtsInitArgs(args),
+                                    os.path.join(session_dir, 'bpv_logs'))
+
+    end_time = time.time()
+
+    bot.common.publisher.put(publish, copy.deepcopy(cfg), session_dir,
+                             zephyr_hash, summary, results, descriptions,
+                             regressions, end_time - start_time)
+
     bot.common.cleanup()
 
     print("\nBye!")
@@ -38,6 +38,7 @@ import sys
 import time
 import logging
 import argparse
+import hashlib
 import shutil
 import xmlrpc.client
 import ctypes
@@ -60,6 +61,11 @@ logtype_whitelist = [ptstypes.PTS_LOGTYPE_START_TEST,
 
 PTS_WORKSPACE_FILE_EXT = ".pqw6"
 
+# Time in seconds to wait for pending response of WID handler that returned
+# "WAIT", and time of single long-poll for it
+PENDING_RESPONSE_TIMEOUT = 90
+PENDING_RESPONSE_POLL_TIMEOUT = 10
+
 
 class PTSLogger(win32com.server.connect.ConnectableServer):
     """PTS control client logger callback implementation"""
@@ -150,7 +156,6 @@ class PTSSender(win32com.server.connect.ConnectableServer):
         };
         """
         logger = logging.getLogger(self.__class__.__name__)
-        timer = 0
 
         # Remove whitespaces from project and test case name
         project_name = project_name.replace(" ", "")
@@ -173,21 +178,22 @@ class PTSSender(win32com.server.connect.ConnectableServer):
                                                       test_case, description,
                                                       style)
 
-                # Don't block xml-rpc
+                # Don't block xml-rpc, long-poll for the response instead.
+                # Client returns it as soon as it is set.
                 if rsp == "WAIT":
-                    rsp = self._callback.get_pending_response(
-                        test_case)
+                    rsp = None
+                    deadline = time.time() + PENDING_RESPONSE_TIMEOUT
+
                     while not rsp:
-                        # XXX: Ask for response every second
-                        timer = timer + 1
-                        # XXX: Timeout 90 seconds
-                        if timer > 90:
+                        remaining = deadline - time.time()
+                        if remaining <= 0:
                             rsp = "Cancel"
                             break
 
-                        logger.info("Rechecking response...")
-                        time.sleep(1)
-                        rsp = self._callback.get_pending_response(test_case)
+                        logger.info("Waiting for response...")
+                        rsp = self._callback.get_pending_response(
+                            test_case,
+                            min(remaining, PENDING_RESPONSE_POLL_TIMEOUT))
 
                 logger.info("callback returned on_implicit_send, respose: %r", rsp)
 
@@ -218,6 +224,17 @@ class PTSSender(win32com.server.connect.ConnectableServer):
                                        [rsp, rsp_len, is_present])
 
 
+def file_hash(path):
+    """Returns SHA-256 hex digest of the file content"""
+    sha = hashlib.sha256()
+
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            sha.update(chunk)
+
+    return sha.hexdigest()
+
+
 def parse_ptscontrol_error(err):
     try:
         _, source, description, _, _, hresult = err.excepinfo
@@ -250,9 +267,11 @@ class PyPTS:
 
         self._init_attributes()
 
-        # list of tuples of methods and arguments to recover after PTS restart
-        self._recov = []
-        self._temp_changes = []
+        # tuples of methods and arguments to recover after PTS restart,
+        # indexed by recovery key, see _recov_key
+        self._recov = {}
+        # (project_name, param_name) of temporarily changed PIXITs
+        self._temp_changes = set()
         self._recov_in_progress = False
 
         self._temp_workspace_path = None
@@ -293,6 +312,27 @@ class PyPTS:
         self.__bd_addr = None
 
         self._pts_projects = {}
+        self._workspace_hash = None
+        self._catalogue = None
+        self._descriptions = {}
+
+        # Shadow copy of PIXIT and PICS values set in PTS, indexed by project
+        # name and PIXIT/PICS name. Used to skip COM calls that change nothing.
+        self._pixits = {}
+        self._pics = {}
+
+    def _recov_key(self, func, args, kwds):
+        """Returns key indexing recovery item
+
+        PIXIT and PICS are indexed by project and parameter name, so that
+        setting new value replaces the old one. Other methods are indexed by
+        all of their arguments.
+
+        """
+        if func in (self.set_pixit, self.set_pics):  # pylint: disable=W0143
+            return func, args[0], args[1]
+
+        return func, args, tuple(sorted(kwds.items()))
 
     def add_recov(self, func, *args, **kwds):
         """Add function to recovery list"""
@@ -301,49 +341,33 @@ class PyPTS:
 
         log("%s %r %r %r", self.add_recov.__name__, func, args, kwds)
 
-        # Re-set recovery element to avoid duplications
-        if func == self.set_pixit:  # pylint: disable=W0143
-            profile = args[0]
-            pixit = args[1]
-            # Look for possible re-setable PIXIT
-            try:
-                # Search for matching recover function, PIXIT and recover if value was changed.
-                item = next(x for x in self._recov if ((x[0] ==
-                                                        self.set_pixit) and (x[1][0] == profile) and
-                                                       (x[1][1] == pixit)))
-
-                self._recov.remove(item)
-                log("%s, re-set pixit: %s", self.add_recov.__name__, pixit)
+        # Re-set recovery element to avoid duplications, keep recovery order
+        # same as order of the calls
+        key = self._recov_key(func, args, kwds)
+        self._recov.pop(key, None)
+        self._recov[key] = (func, args, kwds)
 
-            except StopIteration:
-                pass
-
-        self._recov.append((func, args, kwds))
-
-    def _add_temp_change(self, func, *args, **kwds):
-        """Add function to set temporary value"""
+    def _add_temp_change(self, project_name, param_name):
+        """Add PIXIT to revert after test case"""
         if not self._recov_in_progress:
-            log("%s %r %r %r", self._add_temp_change.__name__, func, args, kwds)
-            self._temp_changes.append((func, args, kwds))
+            log("%s %s %s", self._add_temp_change.__name__, project_name,
+                param_name)
+            self._temp_changes.add((project_name, param_name))
 
     def del_recov(self, func, *args, **kwds):
         """Remove function from recovery list"""
         log("%s %r %r %r", self.del_recov.__name__, func, args, kwds)
 
-        recov_funcs = [item[0] for item in self._recov]
-
-        if func not in recov_funcs:
-            return
-
         # no arguments specified: remove all method calls
         if not args and not kwds:
-            self._recov = [item for item in self._recov if item[0] != func]
+            self._recov = {key: item for key, item in self._recov.items()
+                           if item[0] != func}
 
         # remove single method call with matching arguments
         else:
-            item = (func, args, kwds)
-            if item in self._recov:
-                self._recov.remove(item)
+            key = self._recov_key(func, args, kwds)
+            if self._recov.get(key) == (func, args, kwds):
+                del self._recov[key]
 
     def _recover_item(self, item):
         """Recovery item wraper"""
@@ -373,13 +397,13 @@ class PyPTS:
         """
 
         log("%s", self.recover_pts.__name__)
-        log("recov=%s", self._recov)
+        log("recov=%s", list(self._recov.values()))
 
         self._recov_in_progress = True
 
         self.restart_pts()
 
-        for item in self._recov:
+        for item in list(self._recov.values()):
             self._recover_item(item)
 
         self._recov_in_progress = False
@@ -529,12 +553,18 @@ class PyPTS:
         log("Using temporary workspace: %s", self._temp_workspace_path)
 
         self._pts.OpenWorkspace(self._temp_workspace_path)
+        self._workspace_hash = file_hash(workspace_path)
+        # Workspace brings its own PIXIT and PICS values
+        self._pixits.clear()
+        self._pics.clear()
         self.add_recov(self.open_workspace, workspace_path)
         self._cache_test_cases()
 
     def _cache_test_cases(self):
         """Cache test cases"""
         self._pts_projects.clear()
+        self._catalogue = None
+        self._descriptions.clear()
 
         for i in range(0, self._pts.GetProjectCount()):
             project_name = self._pts.GetProjectName(i)
@@ -545,6 +575,11 @@ class PyPTS:
                                                            j)
                 self._pts_projects[project_name][test_case_name] = j
 
+    def get_workspace_hash(self):
+        """Returns SHA-256 hex digest of the opened workspace file"""
+
+        return self._workspace_hash
+
     def get_project_list(self):
         """Returns list of projects available in the current workspace"""
 
@@ -558,20 +593,56 @@ class PyPTS:
     def get_test_case_list(self, project_name):
         """Returns list of active test cases of the specified project"""
 
-        test_case_list = []
-
-        for test_case_name in list(self._pts_projects[project_name].keys()):
-            if self._pts.IsActiveTestCase(project_name, test_case_name):
-                test_case_list.append(test_case_name)
-
-        return tuple(test_case_list)
+        return tuple(self.get_catalogue()[project_name].keys())
 
     def get_test_case_description(self, project_name, test_case_name):
         """Returns description of the specified test case"""
 
-        test_case_index = self._pts_projects[project_name][test_case_name]
+        key = (project_name, test_case_name)
+
+        if key not in self._descriptions:
+            test_case_index = self._pts_projects[project_name][test_case_name]
+            self._descriptions[key] = self._pts.GetTestCaseDescription(
+                project_name, test_case_index)
+
+        return self._descriptions[key]
+
+    def get_catalogue(self):
+        """Returns active test cases of all projects in the current workspace
+
+        Dictionary of projects, each being a dictionary indexed by active
+        test case name, with test case index and description:
+
+        {project_name: {test_case_name: {"index": ..., "description": ...}}}
+
+        Catalogue is cached until other workspace is opened or PICS are
+        changed.
+
+        """
+        if self._catalogue is not None:
+            return self._catalogue
+
+        log("%s", self.get_catalogue.__name__)
+
+        catalogue = {}
+
+        for project_name, test_cases in self._pts_projects.items():
+            catalogue[project_name] = {}
+
+            for test_case_name, test_case_index in test_cases.items():
+                if not self._pts.IsActiveTestCase(project_name,
+                                                  test_case_name):
+                    continue
+
+                catalogue[project_name][test_case_name] = {
+                    "index": test_case_index,
+                    "description": self.get_test_case_description(
+                        project_name, test_case_name),
+                }
+
+        self._catalogue = catalogue
 
-        return self._pts.GetTestCaseDescription(project_name, test_case_index)
+        return self._catalogue
 
     def _revert_temp_changes(self):
         """Recovery default state for test case"""
@@ -583,25 +654,16 @@ class PyPTS:
 
         self._recov_in_progress = True
 
-        for tch in self._temp_changes:
-            func = tch[0]
-
-            if func == self.update_pixit_param:
-                # Look for possible recoverable parameter
-                try:
-                    '''Search for matching recover function, PIXIT and recover
-                    if value was changed. '''
-                    item = next(x for x in self._recov if ((x[0] ==
-                                                            self.set_pixit) and (x[1][0] ==
-                                                                                 tch[1][0]) and (x[1][1] == tch[1][1])))
-
-                    self._recover_item(item)
+        for project_name, param_name in self._temp_changes:
+            item = self._recov.get((self.set_pixit, project_name, param_name))
+            if item is None:
+                continue
 
-                except StopIteration:
-                    continue
+            # set_pixit skips the call if the default value is in place
+            self._recover_item(item)
 
         self._recov_in_progress = False
-        self._temp_changes = []
+        self._temp_changes = set()
 
     def run_test_case(self, project_name, test_case_name):
         """Executes the specified Test Case.
@@ -668,17 +730,41 @@ class PyPTS:
         In C++ HRESULT error with this value is returned:
         PTSCONTROL_E_PICS_ENTRY_NOT_CHANGED (0x849C0032)
 
+        PTS is not called if the entry was already set to the same value.
+
         """
+        if self._pics.get(project_name, {}).get(entry_name) == bool_value:
+            return
+
         log("%s %s %s %s", self.set_pics.__name__, project_name,
             entry_name, bool_value)
 
-        try:
-            self._pts.UpdatePics(project_name, entry_name, bool_value)
+        if self._update(self._pts.UpdatePics, self._pics, project_name,
+                        entry_name, bool_value,
+                        ptstypes.PTSCONTROL_E_PICS_ENTRY_NOT_CHANGED):
+            # PICS decide which test cases are active
+            self._catalogue = None
             self.add_recov(self.set_pics, project_name, entry_name,
                            bool_value)
 
+    def _update(self, update_func, shadow, project_name, name, value,
+                not_changed_error):
+        """Calls PTS update_func and updates shadow copy of the values
+
+        Returns True if the value is set in PTS, False on error.
+
+        """
+        try:
+            update_func(project_name, name, value)
+
         except pythoncom.com_error as e:
-            parse_ptscontrol_error(e)
+            error_code = parse_ptscontrol_error(e)
+            if error_code != ptstypes.PTSCONTROL_E_STRING[not_changed_error]:
+                return False
+
+        shadow.setdefault(project_name, {})[name] = value
+
+        return True
 
     def set_pixit(self, project_name, param_name, param_value):
         """Set PIXIT
@@ -694,17 +780,33 @@ class PyPTS:
         In C++ HRESULT error with this value is returned:
         PTSCONTROL_E_PIXIT_PARAM_NOT_CHANGED (0x849C0021)
 
+        PTS is not called if the param was already set to the same value.
+
         """
+        if self._pixits.get(project_name, {}).get(param_name) == param_value:
+            return
+
         log("%s %s %s %s", self.set_pixit.__name__, project_name,
             param_name, param_value)
 
-        try:
-            self._pts.UpdatePixitParam(project_name, param_name, param_value)
+        if self._update(self._pts.UpdatePixitParam, self._pixits,
+                        project_name, param_name, param_value,
+                        ptstypes.PTSCONTROL_E_PIXIT_PARAM_NOT_CHANGED):
             self.add_recov(self.set_pixit, project_name, param_name,
                            param_value)
 
-        except pythoncom.com_error as e:
-            parse_ptscontrol_error(e)
+    def set_pixits(self, project_name, pixits):
+        """Set multiple PIXITs
+
+        Same as calling set_pixit for every PIXIT, but with a single call.
+
+        pixits -- dictionary of PIXIT values indexed by PIXIT names
+
+        """
+        log("%s %s %r", self.set_pixits.__name__, project_name, pixits)
+
+        for param_name, param_value in pixits.items():
+            self.set_pixit(project_name, param_name, param_value)
 
     def update_pixit_param(self, project_name, param_name, new_param_value):
         """Updates PIXIT
@@ -718,18 +820,22 @@ class PyPTS:
         In C++ HRESULT error with this value is returned:
         PTSCONTROL_E_PIXIT_PARAM_NOT_CHANGED (0x849C0021)
 
+        The value is reverted to the one set with set_pixit after the test
+        case is run. PTS is not called if the param was already set to the
+        same value.
+
         """
+        if self._pixits.get(project_name, {}).get(param_name) == \
+                new_param_value:
+            return
+
         log("%s %s %s %s", self.update_pixit_param.__name__, project_name,
             param_name, new_param_value)
 
-        try:
-            self._pts.UpdatePixitParam(
-                project_name, param_name, new_param_value)
-            self._add_temp_change(self.update_pixit_param, project_name,
-                                  param_name)
-
-        except pythoncom.com_error as e:
-            parse_ptscontrol_error(e)
+        if self._update(self._pts.UpdatePixitParam, self._pixits,
+                        project_name, param_name, new_param_value,
+                        ptstypes.PTSCONTROL_E_PIXIT_PARAM_NOT_CHANGED):
+            self._add_temp_change(project_name, param_name)
 
     def enable_maximum_logging(self, enable):
         """Enables/disables the maximum logging."""
@@ -0,0 +1,142 @@
+#
+# auto-pts - The Bluetooth PTS Automation Framework
+#
+# Copyright (c) 2017, Intel Corporation.
+#
+# This program is free software; you can redistribute it and/or modify it
+# under the terms and conditions of the GNU General Public License,
+# version 2, as published by the Free Software Foundation.
+#
+# This program is distributed in the hope it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for
+# more details.
+#
+
+"""Mynewt test case hooks, run by ptsprojects/tc_hooks.py daemon
+
+Capture tools are started on the first test case and kept running for the
+whole session, their output is split into per test case log files.
+"""
+
+import os
+import subprocess
+import threading
+import time
+
+from pybtp import iutctl_common
+from pybtp.iutctl_common import BTMON, CaptureLog
+
+RTT2PTY_PROC = None
+RTT2PTY_CONSOLE_PROC = None
+RTT2PTY_PATH = "rtt2pty"
+
+# XXX: Fill me - btmon path example: /home/user/bluez/monitor/btmon
+iutctl_common.BTMON_PATH = 'btmon'
+
+# XXX: Fill me - nrfjprog path example: /home/user/tool/nrfjprog
+CONFIG_PATH = 'nrfjprog'
+
+# XXX: Fill me - logs dir example: /home/user/btmon_logs/
+LOGS_DIR = 'iut_logs/'
+
+# Enable capture tools here
+CAPTURE_RTT2PTY = False
+CAPTURE_BTMON = False
+CAPTURE_IUT_CONSOLE = False
+
+BTMON_CAPTURE = BTMON()
+IUT_LOG = None
+
+
+def cleanup_proc(proc):
+    if proc is not None and proc.poll() is None:
+        proc.terminate()
+        proc.wait()
+
+
+def run_rtt2pty():
+    global RTT2PTY_PROC
+
+    subprocess.check_call('rm -rf ./auto-pts-tester', shell=True)
+
+    cmd = [RTT2PTY_PATH, "-2", "-b", "bttester", "-l", "auto-pts-tester"]
+    print("Executing command: {}".format(' '.join(cmd)))
+
+    RTT2PTY_PROC = subprocess.Popen(cmd, shell=False)
+
+
+def read_console(console, capture_log):
+    for data in iter(lambda: os.read(console, 4096), b''):
+        capture_log.write(data)
+
+    os.close(console)
+
+
+def run_rtt2pty_console():
+    global RTT2PTY_CONSOLE_PROC, IUT_LOG
+
+    subprocess.check_call('rm -rf ./iut_console', shell=True)
+
+    cmd = [RTT2PTY_PATH, "-2", "-l", "iut_console"]
+    print("Executing command: {}".format(' '.join(cmd)))
+
+    RTT2PTY_CONSOLE_PROC = subprocess.Popen(cmd, shell=False)
+
+    # Wait for the console link to appear instead of a fixed delay
+    deadline = time.monotonic() + 3
+    while not os.path.exists('./iut_console'):
+        if time.monotonic() > deadline or \
+                RTT2PTY_CONSOLE_PROC.poll() is not None:
+            raise Exception("rtt2pty console not available")
+        time.sleep(0.1)
+
+    IUT_LOG = CaptureLog('ab')
+    threading.Thread(target=read_console,
+                     args=(os.open('./iut_console', os.O_RDONLY), IUT_LOG),
+                     daemon=True).start()
+
+
+def log_path(profile, test_case, suffix):
+    return os.path.join(LOGS_DIR, profile,
+                        test_case.replace("/", "-") + suffix)
+
+
+def begin(profile, test_case):
+    if not os.path.exists(LOGS_DIR + profile):
+        os.makedirs(LOGS_DIR + profile)
+
+    if CAPTURE_RTT2PTY and RTT2PTY_PROC is None:
+        run_rtt2pty()
+
+    if CAPTURE_IUT_CONSOLE and RTT2PTY_CONSOLE_PROC is None:
+        run_rtt2pty_console()
+
+    if CAPTURE_BTMON:
+        # Starts btmon on first test case, then only switches the file
+        BTMON_CAPTURE.start(log_path(profile, test_case, "_btmon.log"))
+
+    if IUT_LOG:
+        IUT_LOG.attach(log_path(profile, test_case, "_iut.log"))
+
+
+def end(profile, test_case):
+    BTMON_CAPTURE.stop()
+
+    if IUT_LOG:
+        IUT_LOG.detach()
+
+    if not CONFIG_PATH:
+        return
+
+    # Reset controller
+    subprocess.check_call([CONFIG_PATH, "-r"], shell=False)
+
+
+def cleanup():
+    BTMON_CAPTURE.close()
+    cleanup_proc(RTT2PTY_PROC)
+    cleanup_proc(RTT2PTY_CONSOLE_PROC)
+
+    if IUT_LOG:
+        IUT_LOG.detach()
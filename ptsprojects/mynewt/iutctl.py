@@ -17,11 +17,11 @@ import subprocess
 import logging
 import shlex
 import os
-import serial
 
 from pybtp import defs
 from pybtp.types import BTPError
-from pybtp.iutctl_common import BTPWorker, BTP_ADDRESS, RTT2PTY
+from pybtp.iutctl_common import BTPWorker, BTP_ADDRESS, RTT2PTY, \
+    flush_serial
 
 log = logging.debug
 MYNEWT = None
@@ -82,11 +82,7 @@ class MynewtCtl:
 
     def flush_serial(self):
         log("%s.%s", self.__class__, self.flush_serial.__name__)
-        # Try to read data or timeout
-        ser = serial.Serial(port=self.tty_file,
-                            baudrate=SERIAL_BAUDRATE, timeout=1)
-        ser.read(99999)
-        ser.close()
+        flush_serial(self.tty_file, SERIAL_BAUDRATE)
 
     def rtt2pty_start(self):
         if self.rtt2pty:
@@ -96,6 +92,11 @@ class MynewtCtl:
         if self.rtt2pty:
             self.rtt2pty.stop()
 
+    def close_captures(self):
+        """Stop rtt2pty kept running across test cases"""
+        if self.rtt2pty:
+            self.rtt2pty.close()
+
     def reset(self):
         """Restart IUT related processes and reset the IUT"""
         log("%s.%s", self.__class__, self.reset.__name__)
@@ -232,4 +233,5 @@ def cleanup():
 
     if MYNEWT:
         MYNEWT.stop()
+        MYNEWT.close_captures()
         MYNEWT = None
@@ -14,7 +14,7 @@
 #
 
 import logging
-from threading import Lock, Timer, Event
+from threading import Condition, Event
 from pybtp.types import AdType, Addr
 
 STACK = None
@@ -75,21 +75,43 @@ class GattDB:
 
 
 class Property:
+    """Value holder that lets threads wait for the value to change
+
+    Waiters block on a condition variable that is notified every time the
+    data is assigned, so they wake up as soon as the BTP event handler
+    updates the value instead of polling it.
+    """
+
     def __init__(self, data):
-        self._lock = Lock()
-        self.data = data
+        self._cond = Condition()
+        self._data = data
 
-    def __get__(self, instance, owner):
-        with self._lock:
-            return getattr(instance, self.data)
+    @property
+    def data(self):
+        with self._cond:
+            return self._data
 
-    def __set__(self, instance, value):
-        with self._lock:
-            setattr(instance, self.data, value)
+    @data.setter
+    def data(self, value):
+        with self._cond:
+            self._data = value
+            self._cond.notify_all()
 
+    def notify(self):
+        """Wake up waiters after data was modified in place"""
+        with self._cond:
+            self._cond.notify_all()
 
-def timeout_cb(flag):
-    flag.clear()
+    def wait_for(self, predicate, timeout=None):
+        """Wait until predicate(data) is true
+
+        :param predicate: callable taking current data and returning bool
+        :param timeout: timeout in seconds, None to wait forever
+        :return: True if predicate was satisfied, False on timeout
+        """
+        with self._cond:
+            return bool(self._cond.wait_for(lambda: predicate(self._data),
+                                            timeout))
 
 
 class ConnParams:
@@ -127,6 +149,8 @@ class Gap:
         # If disconnected - None
         # If connected - remote address tuple (addr, addr_type)
         self.connected = Property(None)
+        # Set on first connection, Gap is re-created for each test case
+        self.was_connected = False
         self.current_settings = Property({
             "Powered": False,
             "Connectable": False,
@@ -156,38 +180,11 @@ class Gap:
         self.conn_params = Property(None)
 
     def wait_for_connection(self, timeout):
-        if self.is_connected():
-            return True
-
-        flag = Event()
-        flag.set()
-
-        t = Timer(timeout, timeout_cb, [flag])
-        t.start()
-
-        while flag.is_set():
-            if self.is_connected():
-                t.cancel()
-                return True
-
-        return False
+        return self.connected.wait_for(lambda conn: conn is not None,
+                                       timeout)
 
     def wait_for_disconnection(self, timeout):
-        if not self.is_connected():
-            return True
-
-        flag = Event()
-        flag.set()
-
-        t = Timer(timeout, timeout_cb, [flag])
-        t.start()
-
-        while flag.is_set():
-            if not self.is_connected():
-                t.cancel()
-                return True
-
-        return False
+        return self.connected.wait_for(lambda conn: conn is None, timeout)
 
     def is_connected(self):
         return self.connected.data
@@ -237,17 +234,7 @@ class Gap:
         self.found_devices.data = []
 
     def get_passkey(self, timeout=5):
-        if self.passkey.data is None:
-            flag = Event()
-            flag.set()
-
-            t = Timer(timeout, timeout_cb, [flag])
-            t.start()
-
-            while flag.is_set():
-                if self.passkey.data:
-                    t.cancel()
-                    break
+        self.passkey.wait_for(lambda passkey: passkey is not None, timeout)
 
         return self.passkey.data
 
@@ -355,70 +342,20 @@ class Mesh:
         self.proxy_identity = True
 
     def wait_for_incomp_timer_exp(self, timeout):
-        if self.incomp_timer_exp.data:
-            return True
-
-        flag = Event()
-        flag.set()
-
-        t = Timer(timeout, timeout_cb, [flag])
-        t.start()
-
-        while flag.is_set():
-            if self.incomp_timer_exp.data:
-                t.cancel()
-                return True
-
-        return False
+        return self.incomp_timer_exp.wait_for(lambda expired: expired,
+                                              timeout)
 
     def wait_for_attention_timer_exp(self, timeout):
-        flag = Event()
-        flag.set()
-
-        t = Timer(timeout, timeout_cb, [flag])
-        t.start()
-
-        while flag.is_set():
-            state, bearer = self.last_seen_prov_link_state.data
-            if state == 'closed':
-                t.cancel()
-                return True
+        def link_closed(link_state):
+            return link_state is not None and link_state[0] == 'closed'
 
-        return False
+        return self.last_seen_prov_link_state.wait_for(link_closed, timeout)
 
     def wait_for_lpn_established(self, timeout):
-        if self.lpn.data:
-            return True
-
-        flag = Event()
-        flag.set()
-
-        t = Timer(timeout, timeout_cb, [flag])
-        t.start()
-
-        while flag.is_set():
-            if self.lpn.data:
-                t.cancel()
-                return True
-
-        return False
+        return self.lpn.wait_for(lambda lpn: lpn, timeout)
 
     def wait_for_lpn_terminated(self, timeout):
-        if not self.lpn.data:
-            return True
-
-        flag = Event()
-        flag.set()
-
-        t = Timer(timeout, timeout_cb, [flag])
-        t.start()
-
-        while flag.is_set():
-            if not self.lpn.data:
-                t.cancel()
-                return True
-
-        return False
+        return self.lpn.wait_for(lambda lpn: not lpn, timeout)
 
 
 class L2capChan:
@@ -434,27 +371,15 @@ class L2capChan:
         self.peer_bd_addr = bd_addr
         self.disconn_reason = None
         self.data_tx = []
-        self.data_rx = []
-        self.state = "init"  # "connected" / "disconnected"
+        self.data_rx = Property([])
+        self.state = Property("init")  # "connected" / "disconnected"
 
     def _get_state(self, timeout):
-        if self.state and self.state != "init":
-            return self.state
-
         #  In case of self initiated connection, wait a while
         #  for connected/disconnected event
-        flag = Event()
-        flag.set()
-
-        t = Timer(timeout, timeout_cb, [flag])
-        t.start()
+        self.state.wait_for(lambda state: state and state != "init", timeout)
 
-        while flag.is_set():
-            if self.state and self.state != "init":
-                t.cancel()
-                break
-
-        return self.state
+        return self.state.data
 
     def is_connected(self, timeout):
         state = self._get_state(timeout)
@@ -471,35 +396,25 @@ class L2capChan:
         self.our_mps = our_mps
         self.peer_bd_addr_type = bd_addr_type
         self.peer_bd_addr = bd_addr
-        self.state = "connected"
+        self.state.data = "connected"
 
     def disconnected(self, psm, bd_addr_type, bd_addr, reason):
         self.psm = None
         self.peer_bd_addr_type = None
         self.peer_bd_addr = None
         self.disconn_reason = reason
-        self.state = "disconnected"
+        self.state.data = "disconnected"
 
     def rx(self, data):
-        self.data_rx.append(data)
+        self.data_rx.data.append(data)
+        self.data_rx.notify()
 
     def tx(self, data):
         self.data_tx.append(data)
 
     def rx_data_get(self, timeout):
-        if len(self.data_rx) != 0:
-            return self.data_rx
-
-        flag = Event()
-        flag.set()
-
-        t = Timer(timeout, timeout_cb, [flag])
-        t.start()
-
-        while flag.is_set():
-            if len(self.data_rx) != 0:
-                t.cancel()
-                return self.data_rx
+        if self.data_rx.wait_for(lambda data: len(data) != 0, timeout):
+            return self.data_rx.data
 
         return None
 
@@ -535,7 +450,7 @@ class L2cap:
     def clear_data(self):
         for chan in self.channels:
             chan.data_tx = []
-            chan.data_rx = []
+            chan.data_rx.data = []
 
     def reconfigured(self, chan_id, peer_mtu, peer_mps, our_mtu, our_mps):
         channel = self.chan_lookup_id(chan_id)
@@ -577,21 +492,13 @@ class L2cap:
         return chan.is_connected(10)
 
     def wait_for_disconnection(self, chan_id, timeout):
-        if not self.is_connected(chan_id):
+        # Disconnection event removes the channel, look it up only once
+        chan = self.chan_lookup_id(chan_id)
+        if chan is None or not chan.is_connected(10):
             return True
 
-        flag = Event()
-        flag.set()
-
-        t = Timer(timeout, timeout_cb, [flag])
-        t.start()
-
-        while flag.is_set():
-            if not self.is_connected(chan_id):
-                t.cancel()
-                return True
-
-        return False
+        return chan.state.wait_for(lambda state: state != "connected",
+                                   timeout)
 
     def rx(self, chan_id, data):
         chan = self.chan_lookup_id(chan_id)
@@ -0,0 +1,207 @@
+#!/usr/bin/env python
+
+#
+# auto-pts - The Bluetooth PTS Automation Framework
+#
+# Copyright (c) 2017, Intel Corporation.
+#
+# This program is free software; you can redistribute it and/or modify it
+# under the terms and conditions of the GNU General Public License,
+# version 2, as published by the Free Software Foundation.
+#
+# This program is distributed in the hope it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for
+# more details.
+#
+
+"""Test case hooks daemon
+
+Test case hooks of a project are defined in <project>/hooks.py, which can
+implement any of the functions:
+
+begin(profile, test_case) -- called before test case is run
+end(profile, test_case) -- called after test case is run
+cleanup() -- called once, when the daemon exits
+
+The hooks module is loaded by a daemon process started once per session, so
+capture tools started by the hooks keep running across test cases. The
+daemon reads one command per line from stdin:
+
+begin <profile> <test case>
+end <profile> <test case>
+#close
+
+and replies with a line "ok" or "error <description>" to each of the
+begin/end commands. Everything the hooks print goes to the daemon log file.
+The daemon exits on "#close" or when stdin is closed, so the capture tools
+are not left behind if the client dies.
+"""
+
+import atexit
+import importlib.util
+import logging
+import os
+import subprocess
+import sys
+import threading
+import traceback
+
+log = logging.debug
+
+HOOKS_FILE = "hooks.py"
+HOOKS_LOG_FILE = "sp_hooks_stdout.log"
+
+CLOSE_CMD = "#close"
+
+_daemons = {}
+_daemons_lock = threading.Lock()
+
+
+class HooksDaemon:
+    """Client side of the test case hooks daemon of a project"""
+
+    def __init__(self, hooks_path):
+        self.hooks_path = hooks_path
+        self.process = None
+        self.log_file = None
+        # Daemon is shared by test case threads, one request at a time
+        self.lock = threading.Lock()
+
+    def _start(self):
+        hooks_dir = os.path.dirname(self.hooks_path)
+
+        log("%s, starting %s", self._start.__name__, self.hooks_path)
+        if self.log_file is None:
+            self.log_file = open(os.path.join(hooks_dir, HOOKS_LOG_FILE), "w")
+        self.process = subprocess.Popen(
+            [sys.executable, os.path.realpath(__file__), self.hooks_path],
+            shell=False, stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+            stderr=self.log_file, universal_newlines=True, bufsize=1)
+
+    def _request(self, cmd):
+        with self.lock:
+            if self.process is None or self.process.poll() is not None:
+                self._start()
+
+            try:
+                self.process.stdin.write(cmd + "\n")
+                self.process.stdin.flush()
+                reply = self.process.stdout.readline().strip()
+            except (BrokenPipeError, OSError) as e:
+                reply = "error %r" % e
+
+            if not reply:
+                reply = "error hooks daemon exited with %r" % \
+                    self.process.poll()
+
+            if reply != "ok":
+                log("%s, %s: %s", self._request.__name__, cmd, reply)
+                if self.process.poll() is not None:
+                    # Restarted on next request, keep the log of the crash
+                    self.process = None
+
+        return reply == "ok"
+
+    def begin(self, profile, test_case):
+        """Notify the hooks that test case is about to be run"""
+        return self._request(" ".join(["begin", profile, test_case]))
+
+    def end(self, profile, test_case):
+        """Notify the hooks that test case is finished"""
+        return self._request(" ".join(["end", profile, test_case]))
+
+    def close(self):
+        """Stop the daemon, hooks cleanup is run on exit"""
+        with self.lock:
+            if self.process is not None:
+                if self.process.poll() is None:
+                    try:
+                        self.process.communicate(input=CLOSE_CMD + "\n")
+                    except (BrokenPipeError, OSError):
+                        self.process.kill()
+                        self.process.wait()
+                self.process = None
+
+            if self.log_file:
+                self.log_file.close()
+                self.log_file = None
+
+
+def get_hooks(ptsproject_name):
+    """Returns hooks daemon of the project or None if the project has no
+    hooks. The daemon is started on first use and kept for the session.
+    """
+    hooks_path = os.path.join(os.path.dirname(os.path.realpath(__file__)),
+                              ptsproject_name, HOOKS_FILE)
+
+    with _daemons_lock:
+        if hooks_path not in _daemons:
+            if os.path.exists(hooks_path):
+                _daemons[hooks_path] = HooksDaemon(hooks_path)
+            else:
+                _daemons[hooks_path] = None
+
+        return _daemons[hooks_path]
+
+
+@atexit.register
+def close_hooks():
+    """Stop all running hooks daemons"""
+    with _daemons_lock:
+        for daemon in _daemons.values():
+            if daemon is not None:
+                daemon.close()
+
+
+def load_hooks(hooks_path):
+    spec = importlib.util.spec_from_file_location("tc_hooks_module",
+                                                  hooks_path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+
+    return module
+
+
+def main():
+    # Keep stdout for replies only, anything printed by the hooks and the
+    # processes they start goes to the log file
+    replies = os.fdopen(os.dup(sys.stdout.fileno()), "w")
+    os.dup2(sys.stderr.fileno(), sys.stdout.fileno())
+
+    # Let the hooks use auto-pts modules, e.g. pybtp.iutctl_common
+    sys.path.insert(0, os.path.dirname(os.path.dirname(
+        os.path.realpath(__file__))))
+
+    hooks = load_hooks(sys.argv[1])
+    cleanup = getattr(hooks, "cleanup", None)
+    if cleanup:
+        atexit.register(cleanup)
+
+    for line in sys.stdin:
+        line = line.strip()
+        if line == CLOSE_CMD:
+            break
+
+        cmd, _, args = line.partition(" ")
+        profile, _, test_case = args.partition(" ")
+
+        reply = "ok"
+        hook = getattr(hooks, cmd, None)
+        if cmd not in ("begin", "end"):
+            reply = "error unknown command %r" % cmd
+        elif hook:
+            print("#DBG# %s %s %s" % (cmd, profile, test_case))
+            try:
+                hook(profile, test_case)
+            except Exception as e:
+                traceback.print_exc()
+                reply = "error %r" % e
+
+        sys.stdout.flush()
+        replies.write(reply + "\n")
+        replies.flush()
+
+
+if __name__ == "__main__":
+    main()
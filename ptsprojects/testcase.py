@@ -15,9 +15,7 @@
 
 """PTS test case python implementation"""
 
-import shlex
 import os
-import subprocess
 import re
 import sys
 import time
@@ -28,6 +26,7 @@ import errno
 import queue
 
 from .utils import exec_iut_cmd
+from .tc_hooks import get_hooks
 from . import ptstypes
 
 log = logging.debug
@@ -327,6 +326,11 @@ class PTSCallback:
 class TestCase(PTSCallback):
     """A PTS test case"""
 
+    # Maximum time in seconds to let IUT and PTS settle down after test case,
+    # see settle
+    settle_timeout = 3.0
+    settle_poll_interval = 0.1
+
     def copy(self):
         """Copy constructor"""
         return TestCase(self.project_name, self.name, self.cmds,
@@ -405,8 +409,6 @@ class TestCase(PTSCallback):
         self.post_wid_thread = None
         self.thread_exception = queue.Queue()
         self.ptsproject_name = ptsproject_name
-        self.tc_subproc = None
-        self.lf_subproc = None
         self.log_filename = log_filename
         self.log_dir = log_dir
 
@@ -713,6 +715,28 @@ class TestCase(PTSCallback):
         log("Sending response %r", my_response)
         return my_response
 
+    def is_settled(self):
+        """Returns True if IUT and PTS are ready for the next test case
+
+        Test cases that can tell it override this method, by default
+        settle_timeout is always waited.
+        """
+        return False
+
+    def settle(self):
+        """Wait until test case is settled down or settle_timeout elapses"""
+        deadline = time.monotonic() + self.settle_timeout
+
+        while not self.is_settled():
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                log("%s, timeout", self.settle.__name__)
+                return
+
+            time.sleep(min(self.settle_poll_interval, remaining))
+
+        log("%s, settled", self.settle.__name__)
+
     def pre_run(self):
         """Method called before test case is run in PTS"""
         log("%s %s %s" % (self.pre_run.__name__, self.project_name, self.name))
@@ -722,26 +746,10 @@ class TestCase(PTSCallback):
         for index, cmd in enumerate(self.cmds):
             log("%d) %s", index, cmd)
 
-        subproc_dir = (os.path.dirname(os.path.realpath(__file__)) + "/" +
-                       self.ptsproject_name + "/")
-        subproc_path = subproc_dir + "pre_tc.py"
-
-        if os.path.exists(subproc_path):
-            log("%s, run pre test case script" % self.post_run.__name__)
-            self.lf_subproc = open(subproc_dir + "sp_pre_stdout.log", "w")
-
-            if sys.platform == "win32":
-                subproc_cmd = " ".join(["python", repr(subproc_path),
-                                        self.project_name, self.name])
-            else:
-                subproc_cmd = " ".join(
-                    [subproc_path, self.project_name, self.name])
-
-            self.tc_subproc = subprocess.Popen(shlex.split(subproc_cmd),
-                                               shell=False,
-                                               stdin=subprocess.PIPE,
-                                               stdout=self.lf_subproc,
-                                               stderr=self.lf_subproc)
+        hooks = get_hooks(self.ptsproject_name)
+        if hooks:
+            log("%s, run begin test case hooks" % self.pre_run.__name__)
+            hooks.begin(self.project_name, self.name)
 
         # start commands that don't have start trigger (lack start_wid or
         # post_wid) and are not cleanup functions
@@ -773,41 +781,15 @@ class TestCase(PTSCallback):
         # // Allow device to settle down
         # Sleep(3000);
         # otherwise 4th test case just blocks eternally
-        time.sleep(3)
+        self.settle()
 
         for cmd in self.cmds:
             cmd.stop()
 
-        # Cleanup pre created subproc
-        if self.tc_subproc is not None:
-            log("%s, cleanup running pre test case script" %
-                self.post_run.__name__)
-            self.tc_subproc.communicate(input=b'#close\n')
-            self.lf_subproc.close()
-
-        subproc_dir = (os.path.dirname(os.path.realpath(__file__)) + "/" +
-                       self.ptsproject_name + "/")
-        subproc_path = subproc_dir + "post_tc.py"
-
-        if os.path.exists(subproc_path):
-            log("%s, run post test case script" % self.post_run.__name__)
-            self.lf_subproc = open(subproc_dir + "sp_post_stdout.log", "w")
-
-            if sys.platform == "win32":
-                subproc_cmd = " ".join(["python", repr(subproc_path),
-                                        self.project_name, self.name])
-            else:
-                subproc_cmd = " ".join(
-                    [subproc_path, self.project_name, self.name])
-
-            self.tc_subproc = subprocess.Popen(shlex.split(subproc_cmd),
-                                               shell=False,
-                                               stdin=subprocess.PIPE,
-                                               stdout=self.lf_subproc,
-                                               stderr=self.lf_subproc)
-
-            self.tc_subproc.communicate(input=b'#close\n')
-            self.lf_subproc.close()
+        hooks = get_hooks(self.ptsproject_name)
+        if hooks:
+            log("%s, run end test case hooks" % self.post_run.__name__)
+            hooks.end(self.project_name, self.name)
 
 
 class TestCaseLT1(TestCase):
@@ -1,99 +1,139 @@
 import sqlite3
+import threading
+import time
 
 DATABASE_FILE = 'TestCase.db'
 
 
 class TestCaseTable:
-    def __init__(self, name):
-        self._open()
-        self.name = name
-
-        self.cursor.execute(
-            "CREATE TABLE IF NOT EXISTS {} (name TEXT, duration REAL, "
-            "count INTEGER, result TEXT);".format(self.name))
-        self.conn.commit()
+    """Test case statistics stored in sqlite database
 
-        self._close()
+    Table <name> keeps mean duration, run count and last result per test
+    case, table <name>_runs keeps history of every test case run.
 
-    def _open(self):
-        self.conn = sqlite3.connect(DATABASE_FILE)
-        self.cursor = self.conn.cursor()
+    One connection is kept open for the lifetime of the object. It is
+    shared by the threads running test cases, hence the lock.
+    """
 
-    def _close(self):
-        self.cursor.close()
-        self.conn.close()
+    def __init__(self, name, board=None, commit=None):
+        self.name = name
+        self.runs_name = name + '_runs'
+        self.board = board
+        self.commit = commit
+
+        self._lock = threading.Lock()
+        self.conn = sqlite3.connect(DATABASE_FILE, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL;")
+
+        with self.conn:
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS {} (name TEXT, duration REAL, "
+                "count INTEGER, result TEXT);".format(self.name))
+            self.conn.execute(
+                "CREATE INDEX IF NOT EXISTS {0}_name_idx "
+                "ON {0} (name);".format(self.name))
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS {} (name TEXT, timestamp REAL, "
+                "duration REAL, result TEXT, board TEXT, "
+                "commit_id TEXT);".format(self.runs_name))
+            self.conn.execute(
+                "CREATE INDEX IF NOT EXISTS {0}_name_idx "
+                "ON {0} (name);".format(self.runs_name))
+
+    def close(self):
+        with self._lock:
+            self.conn.close()
 
     def update_statistics(self, test_case_name, duration, result):
-        self._open()
-
-        self.cursor.execute(
-            "SELECT duration, count FROM {} "
-            "WHERE name=:name;".format(self.name), {"name": test_case_name})
-        row = self.cursor.fetchall()
-        if len(row) == 0:
-            self.cursor.execute(
-                "INSERT INTO {} VALUES(?, ?, ?, ?);".format(self.name),
-                (test_case_name, duration, 1, result))
-            self.conn.commit()
-            return
-
-        (mean, count) = row[0]
-        if not count:
-            count = 0
-            mean = 0
-
-        count += 1
-        mean += (duration - mean) // count
-
-        self.cursor.execute(
-            "UPDATE {} SET duration=:duration, count=:count, result=:result "
-            "WHERE name=:name".format(self.name), {"duration": mean,
-                                                   "count": count,
-                                                   "name": test_case_name,
-                                                   "result": result})
-        self.conn.commit()
-        self._close()
+        with self._lock, self.conn:
+            self.conn.execute(
+                "INSERT INTO {} VALUES(?, ?, ?, ?, ?, ?);".format(
+                    self.runs_name),
+                (test_case_name, time.time(), duration, result, self.board,
+                 self.commit))
+
+            row = self.conn.execute(
+                "SELECT duration, count FROM {} "
+                "WHERE name=:name;".format(self.name),
+                {"name": test_case_name}).fetchone()
+            if row is None:
+                self.conn.execute(
+                    "INSERT INTO {} VALUES(?, ?, ?, ?);".format(self.name),
+                    (test_case_name, duration, 1, result))
+                return
+
+            (mean, count) = row
+            if not count:
+                count = 0
+                mean = 0
+
+            count += 1
+            mean += (duration - mean) / count
+
+            self.conn.execute(
+                "UPDATE {} SET duration=:duration, count=:count, "
+                "result=:result WHERE name=:name".format(self.name),
+                {"duration": mean, "count": count, "name": test_case_name,
+                 "result": result})
+
+    def _select_one(self, column, test_case_name):
+        with self._lock:
+            row = self.conn.execute(
+                "SELECT {} FROM {} WHERE name=:name;".format(column,
+                                                             self.name),
+                {"name": test_case_name}).fetchone()
 
-    def get_mean_duration(self, test_case_name):
-        self._open()
-
-        self.cursor.execute(
-            "SELECT duration FROM {} "
-            "WHERE name=:name;".format(self.name), {"name": test_case_name})
-        row = self.cursor.fetchone()
         if row is not None:
             return row[0]
 
-        self._close()
         return None
 
-    def get_result(self, test_case_name):
-        self._open()
-
-        self.cursor.execute(
-            "SELECT result FROM {} "
-            "WHERE name=:name".format(self.name), {"name": test_case_name})
-        row = self.cursor.fetchone()
-        if row is not None:
-            return row[0]
+    def get_mean_duration(self, test_case_name):
+        return self._select_one("duration", test_case_name)
 
-        self._close()
-        return None
+    def get_result(self, test_case_name):
+        return self._select_one("result", test_case_name)
+
+    def get_history(self, test_case_name):
+        """Return list of (timestamp, duration, result, board, commit)
+        tuples of all recorded runs of test case, oldest first.
+        """
+        with self._lock:
+            return self.conn.execute(
+                "SELECT timestamp, duration, result, board, commit_id "
+                "FROM {} WHERE name=:name "
+                "ORDER BY timestamp;".format(self.runs_name),
+                {"name": test_case_name}).fetchall()
+
+    def get_statistics(self, test_cases_names):
+        """Return dict of (mean duration, last result) tuples of given test
+        cases, indexed by test case name. Unknown test cases are omitted.
+        """
+        with self._lock:
+            rows = self.conn.execute(
+                "SELECT name, duration, result FROM {};".format(
+                    self.name)).fetchall()
+
+        names = set(test_cases_names)
+
+        return {name: (duration, result) for name, duration, result in rows
+                if name in names}
 
     def estimate_session_duration(self, test_cases_names, run_count_max):
         duration = 0
         count_unknown = 0
         num_test_cases = len(test_cases_names)
+        statistics = self.get_statistics(test_cases_names)
 
         for test_case_name in test_cases_names:
             expected_run_count = 1
+            mean_time, last_result = statistics.get(test_case_name,
+                                                    (None, None))
 
             # Assume worst case scenario
-            last_result = self.get_result(test_case_name)
             if last_result and last_result != 'PASS':
                 expected_run_count = run_count_max
 
-            mean_time = self.get_mean_duration(test_case_name)
             if mean_time is None:
                 count_unknown += 1
             else:
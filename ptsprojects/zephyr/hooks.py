@@ -1,5 +1,3 @@
-#!/usr/bin/env python
-
 #
 # auto-pts - The Bluetooth PTS Automation Framework
 #
@@ -15,45 +13,35 @@
 # more details.
 #
 
-import sys
-import atexit
+"""Zephyr test case hooks, run by ptsprojects/tc_hooks.py daemon
+
+Processes started here keep running across test cases, start them on the
+first test case and terminate them in cleanup.
+"""
+
 import subprocess
 
-CONFIG_PROC = None
 # XXX: Fill me - nrfjprog path example: /home/user/tool/nrfjprog
 CONFIG_PATH = None
 
+# XXX: Fill me - logs dir example: /home/user/btmon_logs/
+LOGS_DIR = 'iut_logs/'
 
-def cleanup():
-    global CONFIG_PROC
-
-    if CONFIG_PROC:
-        CONFIG_PROC.terminate()
-        CONFIG_PROC.wait()
-        CONFIG_PROC = None
 
+def begin(profile, test_case):
+    # Start some subprocess here or switch its log file to the test case,
+    # logs dir is LOGS_DIR + profile
+    pass
 
-def reset_controler():
-    global CONFIG_PROC
 
-    CONFIG_PROC = subprocess.Popen([CONFIG_PATH, "-r"], shell=False)
-    (stdoutdata, stderrdata) = CONFIG_PROC.communicate()
-    print(stdoutdata, stderrdata)
-
-
-def main():
+def end(profile, test_case):
     if not CONFIG_PATH:
         return
 
-    atexit.register(cleanup)
-    reset_controler()
+    # Reset controller
+    subprocess.check_call([CONFIG_PATH, "-r"], shell=False)
 
-    while True:
-        line = sys.stdin.readline()
-        if line == "#close\n":
-            cleanup()
-            break
 
-
-if __name__ == "__main__":
-    main()
+def cleanup():
+    # Terminate subprocess here
+    pass
@@ -20,12 +20,14 @@ import os
 import logging
 import shlex
 import sys
+import threading
 import time
 import serial
 
 from pybtp import defs
 from pybtp.types import BTPError
-from pybtp.iutctl_common import BTPWorker, BTP_ADDRESS, RTT2PTY, BTMON
+from pybtp.iutctl_common import BTPWorker, BTP_ADDRESS, RTT2PTY, BTMON, \
+    CaptureLog, flush_serial
 
 log = logging.debug
 ZEPHYR = None
@@ -35,6 +37,12 @@ QEMU_BIN = "qemu-system-arm"
 
 SERIAL_BAUDRATE = 115200
 
+# Time in seconds QEMU is given to exit before it is terminated
+QEMU_EXIT_TIMEOUT = 1
+
+# Time in seconds given to copy remaining IUT output after processes exit
+LOG_THREAD_JOIN_TIMEOUT = 1
+
 
 def get_qemu_cmd(kernel_image):
     """Returns qemu command to start Zephyr
@@ -65,6 +73,8 @@ class ZephyrCtl:
         self.tty_file = args.tty_file
         self.hci = args.hci
         self.native = None
+        # Keep IUT related processes running between test cases
+        self.warm_reset = getattr(args, 'warm_reset', False)
 
         if self.tty_file and args.board:  # DUT is a hardware board, not QEMU
             self.board = Board(args.board, args.kernel_image, self)
@@ -78,6 +88,8 @@ class ZephyrCtl:
         self.test_case = None
         self.rtt2pty_process = None
         self.iut_log_file = None
+        self.iut_log = CaptureLog('ab')
+        self.log_threads = []
 
         if self.debugger_snr:
             self.btp_address = BTP_ADDRESS + self.debugger_snr
@@ -98,7 +110,19 @@ class ZephyrCtl:
         log("%s.%s", self.__class__, self.start.__name__)
 
         self.test_case = test_case
-        self.iut_log_file = open(os.path.join(test_case.log_dir, "autopts-iutctl-zephyr.log"), "a")
+
+        # Log of running IUT processes is switched to the test case too
+        log_path = os.path.join(test_case.log_dir, "autopts-iutctl-zephyr.log")
+        if self.iut_log_file:
+            self.iut_log_file.close()
+        self.iut_log_file = open(log_path, "a")
+
+        if self.warm_reset:
+            self.iut_log.attach(log_path)
+
+        if self.btp_socket and self.warm_reset:
+            log("IUT processes are kept running")
+            return
 
         self.flush_serial()
 
@@ -125,8 +149,8 @@ class ZephyrCtl:
             # socat dies after socket is closed, so no need to kill it
             self.socat_process = subprocess.Popen(shlex.split(socat_cmd),
                                                   shell=False,
-                                                  stdout=self.iut_log_file,
-                                                  stderr=self.iut_log_file)
+                                                  **self._output_args())
+            self._log_output(self.socat_process)
         elif self.hci is not None:
             socat_cmd = ("socat -x -v %%s,rawer,b115200 UNIX-CONNECT:%s &" %
                          self.btp_address)
@@ -139,8 +163,8 @@ class ZephyrCtl:
             # TODO check if zephyr process has started correctly
             self.native_process = subprocess.Popen(shlex.split(native_cmd),
                                                    shell=False,
-                                                   stdout=self.iut_log_file,
-                                                   stderr=self.iut_log_file)
+                                                   **self._output_args())
+            self._log_output(self.native_process)
         else:
             qemu_cmd = get_qemu_cmd(self.kernel_image)
 
@@ -149,19 +173,39 @@ class ZephyrCtl:
             # TODO check if zephyr process has started correctly
             self.qemu_process = subprocess.Popen(shlex.split(qemu_cmd),
                                                  shell=False,
-                                                 stdout=self.iut_log_file,
-                                                 stderr=self.iut_log_file)
+                                                 **self._output_args())
+            self._log_output(self.qemu_process)
 
         self.btp_socket.accept()
 
+    def _output_args(self):
+        """Output of IUT process is written to the test case log file. In
+        warm reset mode the process outlives the test case, so its output is
+        piped and copied to the log of the current test case.
+        """
+        if self.warm_reset:
+            return {'stdout': subprocess.PIPE, 'stderr': subprocess.STDOUT}
+
+        return {'stdout': self.iut_log_file, 'stderr': self.iut_log_file}
+
+    def _log_output(self, process):
+        """Copy output of IUT process to log of current test case"""
+        if process.stdout is None:
+            return
+
+        def run():
+            fd = process.stdout.fileno()
+            for data in iter(lambda: os.read(fd, 4096), b''):
+                self.iut_log.write(data)
+
+        thread = threading.Thread(target=run, daemon=True)
+        thread.start()
+        self.log_threads.append(thread)
+
     def flush_serial(self):
         log("%s.%s", self.__class__, self.flush_serial.__name__)
-        # Try to read data or timeout
         try:
-            ser = serial.Serial(port=self.tty_file,
-                                baudrate=SERIAL_BAUDRATE, timeout=1)
-            ser.read(99999)
-            ser.close()
+            flush_serial(self.tty_file, SERIAL_BAUDRATE)
         except serial.SerialException:
             pass
 
@@ -184,6 +228,14 @@ class ZephyrCtl:
         if self.btmon:
             self.btmon.stop()
 
+    def close_captures(self):
+        """Stop rtt2pty and btmon kept running across test cases"""
+        if self.rtt2pty:
+            self.rtt2pty.close()
+
+        if self.btmon:
+            self.btmon.close()
+
     def reset(self):
         """Restart IUT related processes and reset the IUT"""
         log("%s.%s", self.__class__, self.reset.__name__)
@@ -200,10 +252,19 @@ class ZephyrCtl:
 
         self.board.reset()
 
-    def wait_iut_ready_event(self):
-        """Wait until IUT sends ready event after power up"""
-        self.reset()
+    def soft_reset(self):
+        """Reset the IUT keeping BTP socket, socat and IUT log file open"""
+        log("%s.%s", self.__class__, self.soft_reset.__name__)
 
+        self.btmon_stop()
+        self.rtt2pty_stop()
+
+        # Drop whatever IUT sent after previous test case
+        self.btp_socket.flush()
+
+        self.board.reset()
+
+    def _read_iut_ready_event(self):
         tuple_hdr, tuple_data = self.btp_socket.read()
 
         try:
@@ -212,13 +273,57 @@ class ZephyrCtl:
                 raise BTPError("Failed to get ready event")
         except BTPError as err:
             log("Unexpected event received (%s), expected IUT ready!", err)
+            return False
+
+        log("IUT ready event received OK")
+        return True
+
+    def wait_iut_ready_event(self):
+        """Wait until IUT sends ready event after power up"""
+        cold_reset = getattr(self.test_case, 'cold_reset', False)
+
+        if self.btp_socket and self.warm_reset and self.board and \
+                not cold_reset:
+            self.soft_reset()
+
+            try:
+                ready = self._read_iut_ready_event()
+            except socket.timeout:
+                ready = False
+
+            if ready:
+                self.rtt2pty_start()
+                self.btmon_start()
+                return
+
+            log("Soft reset failed, restarting IUT processes")
+
+        self.reset()
+
+        if not self._read_iut_ready_event():
             self.stop()
-        else:
-            log("IUT ready event received OK")
 
         self.rtt2pty_start()
         self.btmon_start()
 
+    def end_test_case(self):
+        """Cleanup after test case
+
+        In warm reset mode IUT processes are kept running for the next test
+        case, unless test case ended with an error.
+        """
+        log("%s.%s", self.__class__, self.end_test_case.__name__)
+
+        if self.warm_reset and self.btp_socket and self.test_case and \
+                self.test_case.status in ('PASS', 'FAIL', 'INCONC'):
+            self.btmon_stop()
+            self.rtt2pty_stop()
+            # Output until next test case starts goes to its log
+            self.iut_log.detach()
+            return
+
+        self.stop()
+
     def stop(self):
         """Powers off the Zephyr OS"""
         log("%s.%s", self.__class__, self.stop.__name__)
@@ -233,15 +338,14 @@ class ZephyrCtl:
             self.native_process = None
 
         if self.qemu_process and self.qemu_process.poll() is None:
-            time.sleep(1)
-            self.qemu_process.terminate()
-            self.qemu_process.wait()  # do not let zombies take over
+            # Let QEMU exit on its own after BTP socket is closed
+            try:
+                self.qemu_process.wait(timeout=QEMU_EXIT_TIMEOUT)
+            except subprocess.TimeoutExpired:
+                self.qemu_process.terminate()
+                self.qemu_process.wait()  # do not let zombies take over
             self.qemu_process = None
 
-        if self.iut_log_file:
-            self.iut_log_file.close()
-            self.iut_log_file = None
-
         if self.rtt2pty:
             self.rtt2pty.stop()
 
@@ -250,6 +354,17 @@ class ZephyrCtl:
             self.socat_process.wait()
             self.socat_process = None
 
+        # Processes are gone, let readers copy what is left in the pipes
+        for thread in self.log_threads:
+            thread.join(timeout=LOG_THREAD_JOIN_TIMEOUT)
+        self.log_threads = []
+
+        if self.iut_log_file:
+            self.iut_log_file.close()
+            self.iut_log_file = None
+
+        self.iut_log.detach()
+
 
 class ZephyrCtlStub:
     """Zephyr OS Control Class with stubs for testing"""
@@ -265,6 +380,10 @@ class ZephyrCtlStub:
         """Powers off the Zephyr OS"""
         log("%s.%s", self.__class__, self.stop.__name__)
 
+    def end_test_case(self):
+        """Cleanup after test case"""
+        log("%s.%s", self.__class__, self.end_test_case.__name__)
+
 
 class Board:
     """HW DUT board"""
@@ -381,4 +500,5 @@ def cleanup():
     global ZEPHYR
     if ZEPHYR:
         ZEPHYR.stop()
+        ZEPHYR.close_captures()
         ZEPHYR = None
@@ -23,21 +23,51 @@ from ptsprojects.zephyr.iutctl import get_iut
 class ZTestCase(TestCaseLT1):
     """A Zephyr test case that uses QEMU or HW as DUT"""
 
-    def __init__(self, *args, **kwargs):
-        """Refer to TestCase.__init__ for parameters and their documentation"""
+    def __init__(self, *args, cold_reset=False, **kwargs):
+        """Refer to TestCase.__init__ for parameters and their documentation
+
+        cold_reset -- restart IUT related processes before the test case even
+                      if IUT is in warm reset mode
+
+        """
 
         super().__init__(*args, ptsproject_name="zephyr", **kwargs)
 
+        self.cold_reset = cold_reset
         self.stack = get_stack()
         self.zephyrctl = get_iut()
+        self.settled = False
 
         # first command is to start QEMU or HW
         self.cmds.insert(0, TestFunc(self.zephyrctl.start, self))
         self.cmds.insert(1, TestFunc(self.zephyrctl.wait_iut_ready_event))
 
+        # connection state is lost on stack cleanup, settle down first
+        self.cmds.append(TestFuncCleanUp(self.settle_connection))
         self.cmds.append(TestFuncCleanUp(self.stack.cleanup))
         # last command is to stop QEMU or HW
-        self.cmds.append(TestFuncCleanUp(self.zephyrctl.stop))
+        self.cmds.append(TestFuncCleanUp(self.zephyrctl.end_test_case))
+
+    def pre_run(self):
+        # Test case object is reused when the test case is retried
+        self.settled = False
+        super().pre_run()
+
+    def settle_connection(self):
+        """Settle down while GAP state of the test case is still known"""
+        gap = self.stack.gap
+        if gap and gap.was_connected:
+            self.settle()
+            self.settled = True
+
+    def is_settled(self):
+        """Test case that connected to PTS is settled once disconnected,
+        others wait the full settle_timeout"""
+        if self.settled:
+            return True
+
+        gap = self.stack.gap
+        return bool(gap and gap.was_connected and not gap.is_connected())
 
 
 class ZTestCaseSlave(TestCaseLT2):
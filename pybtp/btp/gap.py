@@ -132,6 +132,7 @@ def gap_connected_ev_(gap, data, data_len):
     addr_type, addr, itvl, latency, timeout = struct.unpack_from(hdr_fmt, data)
     addr = binascii.hexlify(addr[::-1])
 
+    gap.was_connected = True
     gap.connected.data = (addr, addr_type)
     gap.set_conn_params(ConnParams(itvl, latency, timeout))
 
@@ -15,17 +15,19 @@
 
 import logging
 import os
-import queue
+import shutil
 import signal
 import socket
+import struct
 import subprocess
 import sys
+import tempfile
 import threading
 import time
+from collections import deque
 import serial
 if sys.platform != "win32":
-    from fcntl import fcntl, F_GETFL, F_SETFL
-    from os import O_NONBLOCK
+    import select
 
 from pybtp import defs
 from pybtp.types import BTPError
@@ -38,6 +40,23 @@ BTP_ADDRESS = "/tmp/bt-stack-tester"
 
 EVENT_HANDLER = None
 
+# Time in seconds to wait for rtt2pty to report its PTY
+RTT2PTY_START_TIMEOUT = 5
+# Captured data kept while no log file is attached
+CAPTURE_PENDING_MAX = 10000
+CAPTURE_READ_TIMEOUT = 0.1
+
+# Serial port is flushed once IUT stopped sending for that many seconds
+SERIAL_FLUSH_QUIET_TIME = 0.1
+SERIAL_FLUSH_TIMEOUT = 5
+
+# Frames kept on BTPWorker RX queue until read
+RX_FRAMES_MAX = 100
+
+BTMON_PATH = 'btmon'
+BTSNOOP_HDR_LEN = 16
+BTSNOOP_REC_HDR_LEN = 24
+
 
 def set_event_handler(event_handler):
     """This is required by BTPWorker to drive stack"""
@@ -46,6 +65,25 @@ def set_event_handler(event_handler):
     EVENT_HANDLER = event_handler
 
 
+def flush_serial(port, baudrate=115200, quiet_time=SERIAL_FLUSH_QUIET_TIME,
+                 timeout=SERIAL_FLUSH_TIMEOUT):
+    """Drain serial port
+
+    Returns as soon as nothing was received for quiet_time seconds, or after
+    timeout seconds if IUT keeps sending.
+    """
+    with serial.Serial(port=port, baudrate=baudrate,
+                       timeout=quiet_time) as ser:
+        ser.reset_input_buffer()
+
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if not ser.read(max(1, ser.in_waiting)):
+                return
+
+        log("%s, IUT still sending after %ss", flush_serial.__name__, timeout)
+
+
 class BTPSocket:
 
     def __init__(self):
@@ -143,9 +181,15 @@ class BTPWorker(BTPSocket):
     def __init__(self):
         super().__init__()
 
-        self._rx_queue = queue.Queue()
         self._running = threading.Event()
 
+        # Received frames in arrival order, as [data, skipped] items. Reads
+        # waiting for a response skip over frames they do not match, which
+        # are left for later reads. Oldest frames are dropped if nobody
+        # reads them.
+        self._rx_frames = deque(maxlen=RX_FRAMES_MAX)
+        self._rx_cond = threading.Condition()
+
         self._rx_worker = threading.Thread(target=self._rx_task)
 
         self.event_handler_cb = None
@@ -162,72 +206,99 @@ class BTPWorker(BTPSocket):
                     if ret is True:
                         continue
 
-                self._rx_queue.put(data)
+                with self._rx_cond:
+                    if len(self._rx_frames) == self._rx_frames.maxlen:
+                        log("RX queue full, dropping oldest frame")
+                    self._rx_frames.append([data, False])
+                    self._rx_cond.notify_all()
             except (socket.timeout, socket.error):
                 pass  # these are expected so ignore
             except Exception as e:
                 logging.error("%r", e)
 
-    @staticmethod
-    def _read_timeout(flag):
-        flag.clear()
+    def _get(self, timeout, keys=None):
+        """Pop the oldest received frame matching one of keys
+
+        keys - iterable of (svc_id, op) tuples, None to match any frame"""
+        deadline = time.monotonic() + timeout
+
+        with self._rx_cond:
+            while True:
+                for i, frame in enumerate(self._rx_frames):
+                    data, skipped = frame
+                    hdr = data[0]
+                    if keys is None or (hdr.svc_id, hdr.op) in keys:
+                        del self._rx_frames[i]
+                        return data
+
+                    if not skipped:
+                        log("Skipping frame svc_id %r op 0x%.2x",
+                            hdr.svc_id, hdr.op)
+                        frame[1] = True
+
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise socket.timeout
+
+                self._rx_cond.wait(remaining)
 
     def read(self, timeout=20.0):
         logging.debug("%s", self.read.__name__)
 
-        flag = threading.Event()
-        flag.set()
+        return self._get(timeout)
 
-        t = threading.Timer(timeout, self._read_timeout, [flag])
-        t.start()
+    def read_rsp(self, svc_id, op, timeout=20.0):
+        """Wait for the response to the given command
 
-        while flag.is_set():
-            if self._rx_queue.empty():
-                continue
+        Frames received in the meantime are left in arrival order for later
+        reads waiting for them.
 
-            t.cancel()
+        svc_id - service ID of the command
+        op - opcode of the command
+        timeout - read timeout in seconds"""
+        logging.debug("%s %r 0x%.2x", self.read_rsp.__name__, svc_id, op)
 
-            data = self._rx_queue.get()
-            self._rx_queue.task_done()
+        keys = ((svc_id, op), (svc_id, defs.BTP_STATUS))
 
-            return data
+        return self._get(timeout, keys)
 
-        raise socket.timeout
+    def _drop_stale_responses(self):
+        """Drop responses already skipped by reads waiting for other ones,
+        nobody waits for them anymore. Events are kept for later reads."""
+        with self._rx_cond:
+            frames = [frame for frame in self._rx_frames
+                      if not frame[1] or frame[0][0].op >= 0x80]
+            if len(frames) != len(self._rx_frames):
+                log("Dropping %d stale responses",
+                    len(self._rx_frames) - len(frames))
+                self._rx_frames.clear()
+                self._rx_frames.extend(frames)
 
     def send_wait_rsp(self, svc_id, op, ctrl_index, data, cb=None,
                       user_data=None):
+        self._drop_stale_responses()
         super().send(svc_id, op, ctrl_index, data)
         ret = True
 
         while ret:
-            tuple_hdr, tuple_data = self.read()
-
-            if tuple_hdr.svc_id != svc_id:
-                raise BTPError(
-                    "Incorrect service ID %s in the response, expected %s!" %
-                    (tuple_hdr.svc_id, svc_id))
+            tuple_hdr, tuple_data = self.read_rsp(svc_id, op)
 
             if tuple_hdr.op == defs.BTP_STATUS:
                 raise BTPError("Error opcode in response!")
 
-            if op != tuple_hdr.op:
-                raise BTPError(
-                    "Invalid opcode 0x%.2x in the response, expected 0x%.2x!" %
-                    (tuple_hdr.op, op))
-
             if cb and callable(cb):
                 ret = cb(tuple_data, user_data)
             else:
                 return tuple_data
 
-    def _reset_rx_queue(self):
-        while not self._rx_queue.empty():
-            try:
-                self._rx_queue.get_nowait()
-            except queue.Empty:
-                continue
+    def flush(self):
+        """Drop received frames that were not read yet"""
+        logging.debug("%s", self.flush.__name__)
+        self._reset_rx_queue()
 
-            self._rx_queue.task_done()
+    def _reset_rx_queue(self):
+        with self._rx_cond:
+            self._rx_frames.clear()
 
     def accept(self, timeout=10.0):
         logging.debug("%s", self.accept.__name__)
@@ -251,7 +322,63 @@ class BTPWorker(BTPSocket):
         self.event_handler_cb = event_handler
 
 
+class CaptureLog:
+    """Log of a capture process running across test cases
+
+    Data captured while no log file is attached, e.g. IUT boot logs printed
+    between test cases, is kept and written to the next attached log file,
+    so the first lines of a test case are not lost.
+    """
+
+    def __init__(self, mode='a', header=None):
+        self.mode = mode
+        self.header = header
+        self.file = None
+        self.pending = deque(maxlen=CAPTURE_PENDING_MAX)
+        self.lock = threading.Lock()
+
+    def _write(self, data):
+        if self.header and self.file.tell() == 0:
+            self.file.write(self.header)
+
+        self.file.write(data)
+
+    def attach(self, filename):
+        """Write captured data to the file from now on"""
+        with self.lock:
+            if self.file:
+                self.file.close()
+
+            self.file = open(filename, self.mode)
+
+            while self.pending:
+                self._write(self.pending.popleft())
+
+            self.file.flush()
+
+    def detach(self):
+        """Close the log file, data is kept for next one"""
+        with self.lock:
+            if self.file:
+                self.file.close()
+                self.file = None
+
+    def write(self, data):
+        with self.lock:
+            if self.file:
+                self._write(data)
+                self.file.flush()
+            else:
+                self.pending.append(data)
+
+
 class RTT2PTY:
+    """IUT logs captured over RTT
+
+    One rtt2pty process is kept for the whole session, start and stop only
+    switch the log file. The process is restarted if it exits.
+    """
+
     def __init__(self):
         self.serial = None
         self.rtt2pty_process = None
@@ -259,7 +386,7 @@ class RTT2PTY:
         self.serial_thread = None
         self.stop_thread = threading.Event()
         self.log_filename = None
-        self.log_file = None
+        self.log = CaptureLog('a')
 
     def _start_rtt2pty_proc(self, debugger_snr=None):
         cmd = ['rtt2pty']
@@ -269,78 +396,204 @@ class RTT2PTY:
         self.rtt2pty_process = subprocess.Popen(cmd,
                                                 shell=False,
                                                 stdout=subprocess.PIPE,
-                                                stderr=subprocess.PIPE)
-        flags = fcntl(self.rtt2pty_process.stdout, F_GETFL)  # get current p.stdout flags
-        fcntl(self.rtt2pty_process.stdout, F_SETFL, flags | O_NONBLOCK)
+                                                stderr=subprocess.STDOUT)
 
-        time.sleep(3)
+        # Wait for PTY name instead of fixed delay
         pty = None
-        try:
-            for line in iter(self.rtt2pty_process.stdout.readline, b''):
-                line = line.decode('UTF-8')
-                if line.startswith('PTY name is '):
-                    pty = line[len('PTY name is '):].strip()
-        except IOError:
-            pass
+        out = self.rtt2pty_process.stdout
+        deadline = time.monotonic() + RTT2PTY_START_TIMEOUT
+        while pty is None:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0 or not select.select([out], [], [], remaining)[0]:
+                break
+
+            line = out.readline()
+            if not line:
+                break
+
+            line = line.decode('UTF-8')
+            if line.startswith('PTY name is '):
+                pty = line[len('PTY name is '):].strip()
+
+        # Keep draining rtt2pty output, so it does not block on full pipe
+        threading.Thread(target=self._drain, args=(out,), daemon=True).start()
 
         return pty
 
     @staticmethod
-    def _read_from_port(device, stop_thread, file):
+    def _drain(out):
+        for line in iter(out.readline, b''):
+            log("rtt2pty: %s", line.decode('UTF-8', 'replace').rstrip())
+
+    @staticmethod
+    def _read_from_port(device, stop_thread, capture_log):
         while not stop_thread.is_set():
-            line = device.readline()
+            try:
+                line = device.readline()
+            except serial.SerialException:
+                break
+
+            if not line:
+                continue
+
             try:
                 decoded = line.decode()
             except UnicodeDecodeError:
                 continue
-            file.write(decoded)
-            file.flush()
+            capture_log.write(decoded)
+
+    def is_running(self):
+        return self.rtt2pty_process is not None and \
+            self.rtt2pty_process.poll() is None and \
+            self.serial_thread is not None and self.serial_thread.is_alive()
 
     def start(self, log_filename, debugger_snr=None):
         self.log_filename = log_filename
+
+        if not self.is_running():
+            self._start(debugger_snr)
+
+        self.log.attach(log_filename)
+
+    def _start(self, debugger_snr):
+        self.close()
+
         self.pty_name = self._start_rtt2pty_proc(debugger_snr)
+        if self.pty_name is None:
+            logging.error("rtt2pty failed to start")
+            self.close()
+            return
 
-        self.serial = serial.Serial(self.pty_name, 115200, timeout=0)
+        self.serial = serial.Serial(self.pty_name, 115200,
+                                    timeout=CAPTURE_READ_TIMEOUT)
         self.stop_thread.clear()
-        self.log_file = open(self.log_filename, 'a')
         self.serial_thread = threading.Thread(
-            target=self._read_from_port, args=(self.serial, self.stop_thread, self.log_file))
+            target=self._read_from_port, args=(self.serial, self.stop_thread, self.log),
+            daemon=True)
         self.serial_thread.start()
 
     def stop(self):
+        """Stop logging to current log file, capture is kept running"""
+        self.log.detach()
+
+    def close(self):
+        """Stop the capture"""
         self.stop_thread.set()
 
         if self.serial_thread:
             self.serial_thread.join()
             self.serial_thread = None
 
-        if self.log_file:
-            self.log_file.close()
-            self.log_file = None
+        if self.serial:
+            self.serial.close()
+            self.serial = None
 
         if self.rtt2pty_process and self.rtt2pty_process.poll() is None:
             self.rtt2pty_process.send_signal(signal.SIGINT)
             self.rtt2pty_process.wait()
-            self.rtt2pty_process = None
+        self.rtt2pty_process = None
+
+        self.log.detach()
 
 
 class BTMON:
+    """HCI trace captured with btmon
+
+    One btmon process is kept for the whole session. It writes btsnoop
+    records to a FIFO, which are split into per test case btsnoop files.
+    """
+
     def __init__(self):
         self.btmon_process = None
         self.pty_name = None
         self.log_file = None
+        self.fifo_dir = None
+        self.reader_thread = None
+        self.log = CaptureLog('ab')
+
+    def _read_records(self, fifo):
+        with open(fifo, 'rb') as f:
+            header = f.read(BTSNOOP_HDR_LEN)
+            if len(header) < BTSNOOP_HDR_LEN:
+                return
+
+            self.log.header = header
+
+            while True:
+                hdr = f.read(BTSNOOP_REC_HDR_LEN)
+                if len(hdr) < BTSNOOP_REC_HDR_LEN:
+                    break
+
+                incl_len = struct.unpack('>I', hdr[4:8])[0]
+                data = f.read(incl_len)
+                if len(data) < incl_len:
+                    break
 
-    def start(self, log_file, debugger_snr):
+                self.log.write(hdr + data)
+
+    def is_running(self):
+        return self.btmon_process is not None and \
+            self.btmon_process.poll() is None
+
+    def start(self, log_file, debugger_snr=None):
         self.log_file = log_file
-        cmd = ['btmon', '-J', 'NRF52,' + debugger_snr, '-w', self.log_file]
 
-        self.btmon_process = subprocess.Popen(cmd,
-                                              shell=False,
-                                              stdout=subprocess.PIPE,
-                                              stderr=subprocess.PIPE)
+        if not self.is_running():
+            self._start(debugger_snr)
+
+        self.log.attach(log_file)
+
+    def _start(self, debugger_snr):
+        self.close()
+
+        self.fifo_dir = tempfile.mkdtemp(prefix='btmon')
+        fifo = os.path.join(self.fifo_dir, 'btsnoop')
+        os.mkfifo(fifo)
+
+        self.reader_thread = threading.Thread(target=self._read_records,
+                                              args=(fifo,), daemon=True)
+        self.reader_thread.start()
+
+        jlink = 'NRF52'
+        if debugger_snr:
+            jlink += ',' + debugger_snr
+
+        cmd = [BTMON_PATH, '-J', jlink, '-w', fifo]
+
+        try:
+            self.btmon_process = subprocess.Popen(cmd,
+                                                  shell=False,
+                                                  stdout=subprocess.DEVNULL,
+                                                  stderr=subprocess.DEVNULL)
+        except OSError:
+            self.close()
+            raise
 
     def stop(self):
+        """Stop logging to current log file, capture is kept running"""
+        self.log.detach()
+
+    def close(self):
+        """Stop the capture"""
         if self.btmon_process and self.btmon_process.poll() is None:
             self.btmon_process.send_signal(signal.SIGINT)
             self.btmon_process.wait()
-            self.btmon_process = None
+        self.btmon_process = None
+
+        if self.reader_thread:
+            if self.reader_thread.is_alive():
+                # Unblock reader still waiting for btmon to open the FIFO
+                try:
+                    fd = os.open(os.path.join(self.fifo_dir, 'btsnoop'),
+                                 os.O_WRONLY | os.O_NONBLOCK)
+                    os.close(fd)
+                except OSError:
+                    pass
+            self.reader_thread.join()
+            self.reader_thread = None
+
+        if self.fifo_dir:
+            shutil.rmtree(self.fifo_dir, ignore_errors=True)
+            self.fifo_dir = None
+
+        self.log.detach()
@@ -17,7 +17,14 @@
 """Utilities"""
 
 import ctypes
+import http.client
+import select
+import socket
+import socketserver
 import threading
+import types
+import xmlrpc.client
+from xmlrpc.server import SimpleXMLRPCRequestHandler, SimpleXMLRPCServer
 
 
 class InterruptableThread(threading.Thread):
@@ -55,3 +62,116 @@ class InterruptableThread(threading.Thread):
         if res > 1:
             ctypes.pythonapi.PyThreadState_SetAsyncExc(thread_id, 0)
             print('Exception raise failure')
+
+
+class KeepAliveXMLRPCRequestHandler(SimpleXMLRPCRequestHandler):
+    """XML-RPC request handler keeping HTTP/1.1 connections open between
+    requests"""
+    protocol_version = "HTTP/1.1"
+
+    # Headers and body are written separately, do not let Nagle's algorithm
+    # delay the body on persistent connection
+    disable_nagle_algorithm = True
+
+    # Close connections idle for that many seconds
+    timeout = 300
+
+    def log_error(self, format, *args):
+        # Closing idle connection on timeout is expected, do not report it
+        if format.startswith("Request timed out"):
+            return
+
+        super().log_error(format, *args)
+
+
+class ThreadedXMLRPCServer(socketserver.ThreadingMixIn, SimpleXMLRPCServer):
+    """XML-RPC server handling each connection in its own thread, so that
+    a slow call does not block the calls made over other connections"""
+    daemon_threads = True
+
+    def __init__(self, addr, requestHandler=KeepAliveXMLRPCRequestHandler,
+                 **kwargs):
+        super().__init__(addr, requestHandler=requestHandler, **kwargs)
+
+
+class NoDelayHTTPConnection(http.client.HTTPConnection):
+    """HTTP connection with Nagle's algorithm disabled"""
+
+    def connect(self):
+        super().connect()
+        self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+
+class PersistentTransport(xmlrpc.client.Transport):
+    """XML-RPC transport reusing TCP connection for all the requests
+
+    By default one connection is shared by the threads using the proxy and
+    requests are serialized, as single threaded server serves only one
+    connection at a time. With per_thread each thread has its own connection,
+    so that a slow request to a threaded server does not block the others.
+    Before the connection is reused it is checked if the server has not
+    closed it in the meantime.
+
+    use_gzip -- compress requests bigger than encode_threshold
+    per_thread -- use connection per thread, for threaded servers only
+    """
+
+    def __init__(self, use_gzip=False, per_thread=False, **kwargs):
+        if per_thread:
+            self._local = threading.local()
+            self._lock = None
+        else:
+            self._local = types.SimpleNamespace()
+            self._lock = threading.Lock()
+
+        super().__init__(**kwargs)
+
+        if use_gzip:
+            self.encode_threshold = 1400
+
+    # Connection state of xmlrpc.client.Transport, shared or kept per thread
+    @property
+    def _connection(self):
+        return getattr(self._local, 'connection', (None, None))
+
+    @_connection.setter
+    def _connection(self, value):
+        self._local.connection = value
+
+    @property
+    def _extra_headers(self):
+        return getattr(self._local, 'extra_headers', [])
+
+    @_extra_headers.setter
+    def _extra_headers(self, value):
+        self._local.extra_headers = value
+
+    @staticmethod
+    def _is_connection_alive(conn):
+        if conn.sock is None:
+            # Not connected yet or already closed, will connect on request
+            return True
+
+        # Idle connection should have nothing to read, if it is readable
+        # the server has closed it or sent unexpected data
+        readable, _, _ = select.select([conn.sock], [], [], 0)
+        return not readable
+
+    def make_connection(self, host):
+        if self._connection[1]:
+            if host == self._connection[0] and \
+                    self._is_connection_alive(self._connection[1]):
+                return self._connection[1]
+
+            self.close()
+
+        chost, self._extra_headers, _ = self.get_host_info(host)
+        self._connection = host, NoDelayHTTPConnection(chost)
+        return self._connection[1]
+
+    def request(self, host, handler, request_body, verbose=False):
+        if self._lock is None:
+            return super().request(host, handler, request_body, verbose)
+
+        with self._lock:
+            return super().request(host, handler, request_body, verbose)